@@ -82,6 +82,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Транзакции сразу берут блокировку записи: бронирование слотов
+        # (core.reservations) сериализуется и между процессами
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -118,6 +123,50 @@ USE_TZ = True
 
 SITE_URL = 'http://localhost:8000'
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Несколько воркеров — FileBasedCache (общий каталог) или Redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+SLOT_CACHE_TIMEOUT = 10 * 60
+
+# С какого числа мастеров режим «любой мастер» считается на снимке дня (core.schedule_snapshot)
+SNAPSHOT_MIN_SPECIALISTS = 100
+
+# Фрагменты каталога на главной; ключ включает версию каталога (core.catalog)
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Сколько секунд воркер держит SiteSettings в памяти (core.site_settings)
+SITE_SETTINGS_CACHE_TIMEOUT = 60
+
+# Сколько секунд воркер держит индекс промокодов в памяти (core.promo_codes)
+PROMO_INDEX_TIMEOUT = 60
+
+# Сколько минут держится неоплаченная бронь времени
+BOOKING_HOLD_MINUTES = 15
+
+# Сколько минут с создания записи даётся на оплату; потом её отменяет
+# expire_unpaid_bookings (core.booking_expiry)
+PAYMENT_DEADLINE_MINUTES = 60
+
+# HTTP-клиент ЮKassa (core.payments): таймауты (соединение, чтение) в секундах,
+# число повторов при ошибках сети и 429/5xx, размер пула соединений
+YOOKASSA_API_URL = os.getenv('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3')
+YOOKASSA_TIMEOUT = (3.05, 10)
+YOOKASSA_MAX_RETRIES = 2
+YOOKASSA_POOL_SIZE = 10
+
+# Сколько секунд повторное нажатие «Оплатить» получает ту же ссылку из кэша
+PAYMENT_CONFIRMATION_TTL = 10 * 60
+
+# Сколько уведомлений ЮKassa обработчик применяет за одну транзакцию
+PAYMENT_INBOX_BATCH_SIZE = 500
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
@@ -1,12 +1,19 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.utils import timezone
 from django.utils.html import format_html
 
+from .booking_status import cancel_bookings, confirm_bookings, mark_bookings_paid
 from .models import (
     Salon, Procedure, ProcedureOffering,
-    Specialist, SpecialistSalon, WorkShift,
+    Specialist, SpecialistSalon, WorkShift, ShiftTemplate,
     PromoCode, ConsentDocument, ConsentAcceptance,
-    CustomerProfile, Booking, SiteSettings
+    CustomerProfile, Booking, PaymentNotification, SiteSettings
 )
+from .paginators import CappedCountPaginator
+from .shift_templates import generate_shifts
+from .thumbnails import thumbnail_url
 
 
 def image_preview(obj, field_name: str, size: int = 60):
@@ -14,7 +21,8 @@ def image_preview(obj, field_name: str, size: int = 60):
     if not field:
         return "—"
     try:
-        url = field.url
+        # копия вдвое больше превью — для экранов 2x (core.thumbnails)
+        url = thumbnail_url(field, (size * 2, size * 2))
     except Exception:
         return "—"
     return format_html(
@@ -94,12 +102,46 @@ class WorkShiftAdmin(admin.ModelAdmin):
     search_fields = ("specialist__full_name", "salon__name")
     date_hierarchy = "date"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        overlaps = list(obj.overlapping_shifts())
+        if overlaps:
+            self.message_user(
+                request,
+                "Смена пересекается с другими сменами мастера: "
+                + "; ".join(f"{s.start_time:%H:%M}-{s.end_time:%H:%M} ({s.salon})" for s in overlaps),
+                messages.WARNING,
+            )
+
+
+@admin.register(ShiftTemplate)
+class ShiftTemplateAdmin(admin.ModelAdmin):
+    list_display = ("specialist", "salon", "weekday", "start_time", "end_time", "is_active")
+    list_filter = ("salon", "specialist", "weekday", "is_active")
+    search_fields = ("specialist__full_name", "salon__name")
+    list_select_related = ("specialist", "salon")
+    actions = ("generate_four_weeks",)
+
+    @admin.action(description="Создать смены на 4 недели вперёд")
+    def generate_four_weeks(self, request, queryset):
+        date_from = timezone.localdate()
+        created = generate_shifts(
+            date_from=date_from,
+            date_to=date_from + timedelta(weeks=4, days=-1),
+            templates=queryset.filter(is_active=True),
+        )
+        self.message_user(request, f"Создано смен: {created}", messages.SUCCESS)
+
 
 @admin.register(PromoCode)
 class PromoCodeAdmin(admin.ModelAdmin):
-    list_display = ("code", "discount_percent", "is_active", "valid_from", "valid_to")
+    list_display = (
+        "code", "discount_percent", "is_active", "valid_from", "valid_to",
+        "redemptions_count", "max_redemptions",
+    )
     list_filter = ("is_active",)
     search_fields = ("code",)
+    readonly_fields = ("redemptions_count",)
 
 
 @admin.register(ConsentDocument)
@@ -126,10 +168,42 @@ class CustomerProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
-    list_display = ("start_at", "salon", "procedure", "specialist", "phone", "status", "source", "price_final")
+    list_display = ("start_at", "salon", "procedure", "specialist", "phone", "status", "paid_at", "source", "price_final")
     list_filter = ("status", "source", "salon", "procedure")
-    search_fields = ("phone", "customer_name", "specialist__full_name")
+    search_fields = ("phone", "customer_name", "specialist__full_name", "payment_id")
     date_hierarchy = "start_at"
+    list_select_related = ("salon", "procedure", "specialist")
+    # без полного COUNT(*) по таблице записей
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    actions = ("confirm", "cancel", "mark_paid")
+
+    @admin.action(description="Подтвердить")
+    def confirm(self, request, queryset):
+        confirmed, skipped = confirm_bookings(queryset)
+        self.message_user(request, f"Подтверждено записей: {confirmed}", messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request,
+                f"Не подтверждено записей с истёкшей бронью: {skipped} — время могли занять, запишите клиента заново",
+                messages.WARNING,
+            )
+
+    @admin.action(description="Отменить")
+    def cancel(self, request, queryset):
+        self.message_user(request, f"Отменено записей: {cancel_bookings(queryset)}", messages.SUCCESS)
+
+    @admin.action(description="Отметить оплаченными")
+    def mark_paid(self, request, queryset):
+        self.message_user(request, f"Оплаченными отмечено: {mark_bookings_paid(queryset)}", messages.SUCCESS)
+
+
+@admin.register(PaymentNotification)
+class PaymentNotificationAdmin(admin.ModelAdmin):
+    list_display = ("received_at", "event", "payment_id", "status", "processed_at", "problem")
+    list_filter = ("event", ("problem", admin.EmptyFieldListFilter))
+    search_fields = ("payment_id",)
+    readonly_fields = ("event", "payment_id", "status", "payload", "received_at", "processed_at", "problem")
 
 
 @admin.register(SiteSettings)
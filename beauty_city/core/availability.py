@@ -0,0 +1,278 @@
+"""
+Материализованная доступность мастеров: битовые маски 5-минутных интервалов
+по дням (модель SpecialistDayAvailability).
+
+Маска — целое число, бит i соответствует интервалу [5·i, 5·i + 5) минут от
+начала суток. Интервал считается рабочим, только если целиком попадает в
+смену, и занятым, если хоть как-то пересекается с записью. Для расписаний,
+выровненных по 5 минутам, поиск по маске совпадает с core.slots.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+
+from django.db.models import F, Q
+from django.utils.timezone import localtime, make_aware, now
+
+from .models import Booking, SpecialistDayAvailability, WorkShift
+from .slots import SLOT_STEP_MINUTES
+
+BUCKET_MINUTES = 5
+BUCKET_SECONDS = BUCKET_MINUTES * 60
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+BITMAP_BYTES = BUCKETS_PER_DAY // 8
+
+
+class DayBits(NamedTuple):
+    shift_bits: int
+    free_bits: int
+    holds_expire_at: datetime | None = None
+
+
+EMPTY_DAY = DayBits(0, 0)
+
+
+def bits_to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, "little")
+
+
+def bytes_to_bits(value):
+    return int.from_bytes(bytes(value or b""), "little")
+
+
+def _run_mask(first, last):
+    """Маска интервалов [first, last)."""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _time_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def iter_runs(bits):
+    """Непрерывные серии единичных битов: пары (первый, после последнего)."""
+    pos = 0
+    while bits:
+        skip = (bits & -bits).bit_length() - 1
+        bits >>= skip
+        pos += skip
+        length = (~bits & (bits + 1)).bit_length() - 1
+        yield pos, pos + length
+        bits >>= length
+        pos += length
+
+
+def build_day_bits(*, date, shifts, booked_intervals):
+    """Маски (shift_bits, free_bits) для смен и записей одного дня."""
+    shift_bits = 0
+    for shift_start, shift_end in shifts:
+        if not isinstance(shift_start, time) or not isinstance(shift_end, time):
+            continue
+        if shift_start >= shift_end:
+            continue
+        first = -(-_time_seconds(shift_start) // BUCKET_SECONDS)
+        last = _time_seconds(shift_end) // BUCKET_SECONDS
+        shift_bits |= _run_mask(first, last)
+
+    day_start = make_aware(datetime.combine(date, time.min))
+    day_seconds = 24 * 3600
+    busy_bits = 0
+    for b_start, b_end in booked_intervals:
+        start = max(0, (b_start - day_start).total_seconds())
+        end = min(day_seconds, (b_end - day_start).total_seconds())
+        busy_bits |= _run_mask(int(start // BUCKET_SECONDS), int(-(-end // BUCKET_SECONDS)))
+
+    return shift_bits, shift_bits & ~busy_bits
+
+
+def bitmap_slot_times(*, date, shift_bits, free_bits, duration_minutes, now_dt, step_minutes=SLOT_STEP_MINUTES):
+    """
+    Свободные времена начала по маскам дня.
+    Кандидаты идут с шагом step_minutes от начала каждой рабочей серии,
+    проверка кандидата — одно сравнение маски.
+    """
+    need = max(1, -(-duration_minutes // BUCKET_MINUTES))
+    step = max(1, step_minutes // BUCKET_MINUTES)
+    window = (1 << need) - 1
+    day_start = make_aware(datetime.combine(date, time.min))
+
+    available_times = []
+    for run_start, run_end in iter_runs(shift_bits):
+        pos = run_start
+        while pos + need <= run_end:
+            if (free_bits >> pos) & window == window:
+                slot_dt = day_start + timedelta(minutes=pos * BUCKET_MINUTES)
+                if slot_dt >= now_dt:
+                    available_times.append(slot_dt.time())
+            pos += step
+    return available_times
+
+
+def compute_days(*, date_from, date_to, salon_ids=None, specialist_ids=None):
+    """
+    Свежий расчёт масок по сменам и записям за диапазон дат.
+    Возвращает {(salon_id, specialist_id, date): DayBits} для всех дней,
+    где у мастера есть смены. Два запроса на весь диапазон.
+    """
+    shifts = WorkShift.objects.filter(date__gte=date_from, date__lte=date_to)
+    bookings = Booking.objects.filter(
+        specialist__isnull=False,
+        start_at__gte=make_aware(datetime.combine(date_from, time.min)),
+        start_at__lte=make_aware(datetime.combine(date_to, time.max)),
+    ).blocking()
+    if salon_ids is not None:
+        shifts = shifts.filter(salon_id__in=salon_ids)
+        bookings = bookings.filter(salon_id__in=salon_ids)
+    if specialist_ids is not None:
+        shifts = shifts.filter(specialist_id__in=specialist_ids)
+        bookings = bookings.filter(specialist_id__in=specialist_ids)
+
+    shifts_by_day = defaultdict(list)
+    for salon_id, specialist_id, day, start_time, end_time in shifts.values_list(
+        "salon_id", "specialist_id", "date", "start_time", "end_time"
+    ):
+        shifts_by_day[(salon_id, specialist_id, day)].append((start_time, end_time))
+
+    bookings_by_day = defaultdict(list)
+    holds_by_day = {}
+    for salon_id, specialist_id, start_at, end_at, hold_expires_at, payment_id in bookings.order_by().values_list(
+        "salon_id", "specialist_id", "start_at", "end_at", "hold_expires_at", "payment_id"
+    ):
+        key = (salon_id, specialist_id, localtime(start_at).date())
+        if key not in shifts_by_day:
+            continue
+        bookings_by_day[key].append((start_at, end_at))
+        if hold_expires_at and not payment_id:
+            holds_by_day[key] = min(hold_expires_at, holds_by_day.get(key, hold_expires_at))
+
+    return {
+        key: DayBits(
+            *build_day_bits(date=key[2], shifts=day_shifts, booked_intervals=bookings_by_day[key]),
+            holds_expire_at=holds_by_day.get(key),
+        )
+        for key, day_shifts in shifts_by_day.items()
+    }
+
+
+def save_days(days):
+    """
+    Записать маски {(salon_id, specialist_id, date): DayBits}
+    одним upsert и поднять версии этих дней.
+    """
+    rows = [
+        SpecialistDayAvailability(
+            salon_id=salon_id,
+            specialist_id=specialist_id,
+            date=day,
+            shift_bits=bits_to_bytes(bits.shift_bits),
+            free_bits=bits_to_bytes(bits.free_bits),
+            holds_expire_at=bits.holds_expire_at,
+        )
+        for (salon_id, specialist_id, day), bits in days.items()
+    ]
+    SpecialistDayAvailability.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["salon", "specialist", "date"],
+        update_fields=["shift_bits", "free_bits", "holds_expire_at", "updated_at"],
+    )
+    bump_versions(days)
+
+
+def bump_versions(keys, batch_size=100):
+    """Увеличить version у дней (salon_id, specialist_id, date)."""
+    keys = list(keys)
+    for offset in range(0, len(keys), batch_size):
+        condition = Q()
+        for salon_id, specialist_id, day in keys[offset:offset + batch_size]:
+            condition |= Q(salon_id=salon_id, specialist_id=specialist_id, date=day)
+        SpecialistDayAvailability.objects.filter(condition).update(version=F("version") + 1)
+
+
+def get_day_version(salon_id, specialist_id, date):
+    """
+    Текущая версия дня мастера; 0, если день ещё не материализован.
+    Если за это время истекла неоплаченная бронь, день пересчитывается
+    и версия растёт — освободившееся время сразу видно в кэше и ETag.
+    """
+    row = SpecialistDayAvailability.objects.filter(
+        salon_id=salon_id, specialist_id=specialist_id, date=date,
+    ).values_list("version", "holds_expire_at").first()
+    if row is None:
+        return 0
+    version, holds_expire_at = row
+    if holds_expire_at and holds_expire_at <= now():
+        refresh_day(salon_id, specialist_id, date)
+        return version + 1
+    return version
+
+
+def refresh_days(keys):
+    """
+    Пересчитать маски для набора дней (salon_id, specialist_id, date).
+    Дни без смен сохраняются с пустыми масками.
+    """
+    keys = {key for key in keys if all(key)}
+    if not keys:
+        return
+    dates = [day for _, _, day in keys]
+    fresh = compute_days(
+        date_from=min(dates),
+        date_to=max(dates),
+        salon_ids={salon_id for salon_id, _, _ in keys},
+        specialist_ids={specialist_id for _, specialist_id, _ in keys},
+    )
+    save_days({key: fresh.get(key, EMPTY_DAY) for key in keys})
+
+
+def refresh_day(salon_id, specialist_id, date):
+    refresh_days([(salon_id, specialist_id, date)])
+
+
+def get_available_slots_from_bitmap(*, salon, specialist, procedure, date):
+    """
+    То же, что core.slots.get_available_slots, но по сохранённой маске дня:
+    один запрос и поиск серий битов. Отсутствующий день достраивается.
+    """
+    row = SpecialistDayAvailability.objects.filter(
+        salon=salon, specialist=specialist, date=date,
+    ).only("shift_bits", "free_bits", "holds_expire_at").first()
+    if row is None or (row.holds_expire_at and row.holds_expire_at <= now()):
+        refresh_day(salon.pk, specialist.pk, date)
+        row = SpecialistDayAvailability.objects.get(salon=salon, specialist=specialist, date=date)
+
+    return bitmap_slot_times(
+        date=date,
+        shift_bits=bytes_to_bits(row.shift_bits),
+        free_bits=bytes_to_bits(row.free_bits),
+        duration_minutes=procedure.duration_minutes,
+        now_dt=localtime(now()),
+    )
+
+
+def find_inconsistent_days(*, date_from, date_to):
+    """
+    Сверка сохранённых масок со свежим расчётом.
+    Возвращает список (salon_id, specialist_id, date, причина).
+    """
+    fresh = {key: bits[:2] for key, bits in compute_days(date_from=date_from, date_to=date_to).items()}
+    stored = {
+        (salon_id, specialist_id, day): (bytes_to_bits(shift_bits), bytes_to_bits(free_bits))
+        for salon_id, specialist_id, day, shift_bits, free_bits in SpecialistDayAvailability.objects.filter(
+            date__gte=date_from, date__lte=date_to,
+        ).values_list("salon_id", "specialist_id", "date", "shift_bits", "free_bits")
+    }
+
+    problems = []
+    for key in sorted(fresh.keys() | stored.keys()):
+        expected = fresh.get(key, (0, 0))
+        if key not in stored:
+            problems.append((*key, "нет строки"))
+        elif stored[key][0] != expected[0]:
+            problems.append((*key, "смены не совпадают"))
+        elif stored[key][1] != expected[1]:
+            problems.append((*key, "свободные интервалы не совпадают"))
+    return problems
@@ -0,0 +1,63 @@
+"""
+Отмена неоплаченных записей.
+
+Запись с сайта (есть hold_expires_at) отменяется, если она всё ещё новая,
+оплату по ней не начали (нет payment_id) и при этом либо бронь истекла, либо
+с создания прошло PAYMENT_DEADLINE_MINUTES. Запись с платежом в ЮKassa не
+отменяется: клиент ещё может оплатить. Неоплаченный платёж ЮKassa со временем
+отменяет сама, уведомление или сверка (команда сначала сверяет платежи старше
+PAYMENT_DEADLINE_MINUTES) снимают payment_id, и запись уходит при следующем
+проходе. Отмена идёт пачками: один
+UPDATE на пачку (core.booking_status.cancel_bookings — он же возвращает
+использования промокодов и пересчитывает маски доступности).
+Записи со звонков и из админки (без брони) не трогаются.
+
+    python manage.py expire_unpaid_bookings
+    python manage.py expire_unpaid_bookings --loop --interval 60
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .booking_status import cancel_bookings
+from .models import Booking
+
+PAYMENT_DEADLINE_MINUTES = getattr(settings, "PAYMENT_DEADLINE_MINUTES", 60)
+EXPIRY_BATCH_SIZE = 500
+
+
+def unpaid_expired_bookings(at=None, deadline_minutes=PAYMENT_DEADLINE_MINUTES):
+    at = at or timezone.now()
+    return Booking.objects.filter(
+        Q(hold_expires_at__lte=at) | Q(created_at__lte=at - timedelta(minutes=deadline_minutes)),
+        status=Booking.Status.NEW,
+        payment_id="",
+        paid_at__isnull=True,
+        hold_expires_at__isnull=False,
+    )
+
+
+def expire_batch(at=None, deadline_minutes=PAYMENT_DEADLINE_MINUTES, batch_size=EXPIRY_BATCH_SIZE):
+    """Отменить одну пачку просроченных записей; возвращает её размер."""
+    with transaction.atomic():
+        expired = unpaid_expired_bookings(at, deadline_minutes).order_by("pk")
+        if connection.features.has_select_for_update_skip_locked:
+            expired = expired.select_for_update(skip_locked=True)
+        pks = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return 0
+        return cancel_bookings(Booking.objects.filter(pk__in=pks))
+
+
+def expire_unpaid_bookings(at=None, deadline_minutes=PAYMENT_DEADLINE_MINUTES, batch_size=EXPIRY_BATCH_SIZE):
+    """Отменить все просроченные неоплаченные записи; возвращает их число."""
+    at = at or timezone.now()
+    total = 0
+    while True:
+        expired = expire_batch(at, deadline_minutes, batch_size)
+        total += expired
+        if expired < batch_size:
+            return total
@@ -0,0 +1,77 @@
+"""
+Массовая смена статуса записей: один UPDATE на всю выборку
+(действия админки, отмена неоплаченных записей в core.booking_expiry).
+
+UPDATE не вызывает сигналы, поэтому маски доступности задетых дней
+пересчитываются здесь же, а отменённые записи возвращают использования
+промокодов и теряют закэшированные ссылки на оплату.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.timezone import localtime
+
+from .availability import refresh_days
+from .models import Booking
+from .payments import forget_booking_payments
+from .promo_codes import release_promo_redemptions
+
+
+def _update(queryset, **fields):
+    """UPDATE выборки; возвращает затронутые записи (pk, день мастера, промокод, телефон)."""
+    with transaction.atomic():
+        rows = list(queryset.order_by().values_list(
+            "pk", "salon_id", "specialist_id", "start_at", "promo_code_id", "phone",
+        ))
+        if rows:
+            Booking.objects.filter(pk__in=[row[0] for row in rows]).update(**fields)
+    return rows
+
+
+def _refresh(rows):
+    refresh_days({
+        (salon_id, specialist_id, localtime(start_at).date())
+        for _, salon_id, specialist_id, start_at, _, _ in rows
+        if specialist_id
+    })
+
+
+def confirm_bookings(queryset, at=None):
+    """
+    Подтвердить новые записи. Бронь снимается — подтверждённая запись
+    держит время и без оплаты. Записи с истёкшей бронью (оплату не начали)
+    пропускаются: их время уже свободно и могло достаться другому клиенту.
+    Возвращает (подтверждено, пропущено).
+    """
+    expired_hold = Q(hold_expires_at__lte=at or timezone.now(), payment_id="")
+    new = queryset.filter(status=Booking.Status.NEW)
+    with transaction.atomic():
+        skipped = new.filter(expired_hold).count()
+        rows = _update(new.exclude(expired_hold), status=Booking.Status.CONFIRMED, hold_expires_at=None)
+    _refresh(rows)
+    return len(rows), skipped
+
+
+def mark_bookings_paid(queryset, at=None):
+    """Отметить оплаченными (и подтвердить) неотменённые записи; paid_at не перезаписывается."""
+    rows = _update(
+        queryset.exclude(status=Booking.Status.CANCELED),
+        status=Booking.Status.CONFIRMED,
+        hold_expires_at=None,
+        paid_at=Coalesce(F("paid_at"), Value(at or timezone.now())),
+    )
+    _refresh(rows)
+    return len(rows)
+
+
+def cancel_bookings(queryset):
+    """Отменить записи, освободить их время и вернуть использования промокодов."""
+    with transaction.atomic():
+        rows = _update(queryset.exclude(status=Booking.Status.CANCELED), status=Booking.Status.CANCELED)
+        release_promo_redemptions(
+            (promo_id, phone) for _, _, _, _, promo_id, phone in rows if promo_id
+        )
+    forget_booking_payments([row[0] for row in rows])
+    _refresh(rows)
+    return len(rows)
@@ -0,0 +1,32 @@
+"""
+Версия каталога (салоны, процедуры, мастера, цены) для кэша фрагментов
+главной и матрицы цен (core.pricing).
+
+Версия хранится в общем кэше, чтобы её видели все воркеры; сигналы
+сохранения и удаления Salon, Procedure, Specialist, SpecialistSalon и
+ProcedureOffering её меняют (см. core/signals.py). Значение — время
+смены в наносекундах: если кэш потерял ключ, новая версия всё равно
+не совпадёт со старыми фрагментами. queryset.update() сигналов не шлёт — после массовых правок
+нужно вызвать bump_catalog_version() вручную.
+"""
+import time as time_module
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOG_CACHE_ALIAS = getattr(settings, "CATALOG_CACHE_ALIAS", "default")
+CATALOG_CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 24 * 60 * 60)
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def get_catalog_version():
+    cache = caches[CATALOG_CACHE_ALIAS]
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, str(time_module.time_ns()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs):
+    caches[CATALOG_CACHE_ALIAS].set(CATALOG_VERSION_KEY, str(time_module.time_ns()), None)
@@ -1,4 +1,8 @@
-from .models import SiteSettings
+from django.utils.functional import SimpleLazyObject
+
+from .site_settings import get_site_settings
+
 
 def site_settings(request):
-    return {"settings": SiteSettings.objects.first()}
+    # запрос выполнится, только если шаблон обратится к settings
+    return {"settings": SimpleLazyObject(get_site_settings)}
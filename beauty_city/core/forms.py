@@ -6,18 +6,18 @@ from .models import Booking
 
 
 class BookingForm(forms.ModelForm):
-    """Форма для создания записи на услугу"""
+    """
+    Форма для создания записи на услугу.
+    Салон, процедуру и мастера подставляет view (они уже загружены
+    по GET-параметрам), поэтому в форме их нет — без лишних запросов.
+    """
 
     class Meta:
         model = Booking
         fields = [
-            'salon', 'procedure', 'specialist',
             'customer_name', 'phone', 'question'
         ]
         widgets = {
-            'salon': forms.HiddenInput(),
-            'procedure': forms.HiddenInput(),
-            'specialist': forms.HiddenInput(),
             'question': forms.Textarea(attrs={
                 'class': 'contacts__form_textarea',
                 'placeholder': 'Вопрос (необязательно)',
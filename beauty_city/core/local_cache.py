@@ -0,0 +1,35 @@
+"""
+Значение, загружаемое из базы один раз на процесс.
+
+Сбрасывается вызовом clear() (из сигналов) и по таймауту — так остальные
+воркеры тоже подхватывают изменения. Счётчик поколений не даёт чтению,
+начатому до сброса, положить в кэш устаревшее значение.
+"""
+import threading
+import time as time_module
+
+
+class LocalValue:
+    def __init__(self, loader, timeout):
+        self.loader = loader
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cached = None  # (generation, expires_at, value)
+
+    def get(self):
+        cached = self._cached
+        if cached is not None and cached[0] == self._generation and cached[1] > time_module.monotonic():
+            return cached[2]
+
+        generation = self._generation
+        value = self.loader()
+        with self._lock:
+            if generation == self._generation:
+                self._cached = (generation, time_module.monotonic() + self.timeout, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cached = None
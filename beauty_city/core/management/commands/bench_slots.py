@@ -0,0 +1,69 @@
+"""
+Бенчмарк движков слотов на сгенерированных расписаниях:
+    python manage.py bench_slots --bookings 10 50 200 --days 200
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.slots import merge_shifts, scan_slot_times, scan_slot_times_naive
+
+
+class Command(BaseCommand):
+    help = "Сравнить sweep-движок слотов со старым перебором"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument("--days", type=int, default=200, help="Сколько расписаний генерировать")
+        parser.add_argument("--duration", type=int, default=15, help="Длительность процедуры, мин")
+        parser.add_argument("--step", type=int, default=5, help="Шаг кандидатов, мин")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        day = date(2026, 3, 14)
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        duration = timedelta(minutes=options["duration"])
+        step = timedelta(minutes=options["step"])
+        shifts = [(time(8), time(14)), (time(14), time(22))]
+        # перебор смены не склеивает: стыкующиеся смены дали бы ему другие слоты
+        engines = (
+            ("naive", scan_slot_times_naive, merge_shifts(shifts)),
+            ("sweep", scan_slot_times, shifts),
+        )
+
+        for bookings_count in options["bookings"]:
+            schedules = []
+            for _ in range(options["days"]):
+                booked = []
+                for _ in range(bookings_count):
+                    start = day_start + timedelta(minutes=rng.randrange(8 * 60, 22 * 60, 5))
+                    booked.append((start, start + timedelta(minutes=rng.choice([10, 15, 30]))))
+                schedules.append(booked)
+
+            timings = {}
+            results = {}
+            for name, engine, engine_shifts in engines:
+                started = default_timer()
+                results[name] = [
+                    engine(
+                        date=day, shifts=engine_shifts, booked_intervals=booked,
+                        duration=duration, now_dt=day_start, step=step,
+                    )
+                    for booked in schedules
+                ]
+                timings[name] = default_timer() - started
+
+            if results["naive"] != results["sweep"]:
+                self.stderr.write(self.style.ERROR(f"bookings={bookings_count}: результаты расходятся"))
+                continue
+
+            self.stdout.write(
+                f"bookings={bookings_count:<5} "
+                f"naive={timings['naive'] * 1000:8.1f} ms  "
+                f"sweep={timings['sweep'] * 1000:8.1f} ms  "
+                f"x{timings['naive'] / timings['sweep']:.1f}"
+            )
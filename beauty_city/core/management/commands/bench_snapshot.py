@@ -0,0 +1,92 @@
+"""
+Бенчмарк снимка дня салона (core.schedule_snapshot) против цикла по мастерам:
+    python manage.py bench_snapshot --specialists 10 50 100 200 --bookings 12 --step 5
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Specialist
+from core.schedule_snapshot import SalonDaySnapshot
+from core.slots import scan_slot_times
+
+
+class Command(BaseCommand):
+    help = "Сравнить векторный снимок дня салона с расчётом слотов по каждому мастеру"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--specialists", type=int, nargs="+", default=[10, 50, 100, 200])
+        parser.add_argument("--bookings", type=int, default=12, help="Записей на мастера")
+        parser.add_argument("--duration", type=int, default=60, help="Длительность процедуры, мин")
+        parser.add_argument("--step", type=int, default=30, help="Шаг кандидатов, мин")
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов расчёта")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        day = date(2026, 3, 14)
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        duration = options["duration"]
+        step = options["step"]
+        repeat = options["repeat"]
+
+        for specialists_count in options["specialists"]:
+            specialists = [Specialist(pk=pk, full_name=f"Мастер {pk}") for pk in range(1, specialists_count + 1)]
+            shifts_by_day = {}
+            bookings_by_day = {}
+            for specialist in specialists:
+                key = (specialist.pk, day)
+                shifts_by_day[key] = [(time(rng.choice([8, 9, 10])), time(rng.choice([18, 20, 21])))]
+                booked = []
+                for _ in range(options["bookings"]):
+                    start = day_start + timedelta(minutes=rng.randrange(8 * 60, 21 * 60, 15))
+                    booked.append((start, start + timedelta(minutes=rng.choice([30, 60, 90]))))
+                bookings_by_day[key] = booked
+
+            started = default_timer()
+            for _ in range(repeat):
+                loop_result = {}
+                for specialist in specialists:
+                    key = (specialist.pk, day)
+                    for slot_time in scan_slot_times(
+                        date=day,
+                        shifts=shifts_by_day[key],
+                        booked_intervals=bookings_by_day[key],
+                        duration=timedelta(minutes=duration),
+                        now_dt=day_start,
+                        step=timedelta(minutes=step),
+                    ):
+                        loop_result.setdefault(slot_time, []).append(specialist)
+            loop_time = (default_timer() - started) / repeat
+
+            # снимок строится один раз и переиспользуется для разных процедур,
+            # поэтому построение и поиск окон меряются отдельно
+            started = default_timer()
+            for _ in range(repeat):
+                snapshot = SalonDaySnapshot.from_schedule(
+                    date=day,
+                    specialists=specialists,
+                    shifts_by_day=shifts_by_day,
+                    bookings_by_day=bookings_by_day,
+                )
+            build_time = (default_timer() - started) / repeat
+
+            started = default_timer()
+            for _ in range(repeat):
+                snapshot_result = snapshot.availability(duration, now_dt=day_start, step_minutes=step)
+            query_time = (default_timer() - started) / repeat
+
+            if snapshot_result != sorted(loop_result.items()):
+                self.stderr.write(self.style.ERROR(f"specialists={specialists_count}: результаты расходятся"))
+                continue
+
+            self.stdout.write(
+                f"specialists={specialists_count:<5} "
+                f"loop={loop_time * 1000:8.2f} ms  "
+                f"snapshot build={build_time * 1000:8.2f} ms  "
+                f"query={query_time * 1000:8.2f} ms  "
+                f"x{loop_time / (build_time + query_time):.1f}"
+            )
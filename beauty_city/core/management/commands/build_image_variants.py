@@ -0,0 +1,37 @@
+"""
+Создать недостающие копии фото (core.thumbnails) для уже загруженных файлов:
+    python manage.py build_image_variants
+    python manage.py build_image_variants --workers 8
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.thumbnails import DERIVATIVE_FIELDS, is_svg, make_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Создать превью и варианты для srcset для всех загруженных фото"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Параллельных потоков")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers должно быть не меньше 1")
+
+        # Pillow отпускает GIL при декодировании, масштабировании и кодировании,
+        # поэтому потоки дают параллельность и без отдельных процессов
+        jobs = []
+        for model, field_name, responsive in DERIVATIVE_FIELDS:
+            uploaded = model.objects.exclude(**{f"{field_name}__isnull": True}).exclude(**{field_name: ""})
+            for instance in uploaded.only(field_name):
+                field_file = getattr(instance, field_name)
+                if not is_svg(field_file.name):
+                    jobs.append((field_file, responsive))
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            list(executor.map(lambda job: make_thumbnails(job[0], responsive=job[1]), jobs))
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано фото: {len(jobs)}"))
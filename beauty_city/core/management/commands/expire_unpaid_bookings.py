@@ -0,0 +1,44 @@
+"""
+Отмена неоплаченных записей (core.booking_expiry):
+    python manage.py expire_unpaid_bookings
+    python manage.py expire_unpaid_bookings --loop --interval 60
+"""
+import time as time_module
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.booking_expiry import EXPIRY_BATCH_SIZE, PAYMENT_DEADLINE_MINUTES, expire_unpaid_bookings
+from core.payment_reconcile import reconcile_payments
+from core.payments import PaymentError
+
+
+class Command(BaseCommand):
+    help = "Отменить записи, которые не оплатили вовремя, и освободить их время"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--deadline", type=int, default=PAYMENT_DEADLINE_MINUTES, help="Минут на оплату")
+        parser.add_argument("--batch-size", type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument(
+            "--no-reconcile", action="store_true",
+            help="Не сверять платежи с ЮKassa перед отменой (оплату, о которой не пришёл webhook, не увидим)",
+        )
+        parser.add_argument("--loop", action="store_true", help="Работать постоянно")
+        parser.add_argument("--interval", type=float, default=60, help="Пауза между проходами, сек")
+
+    def handle(self, *args, **options):
+        while True:
+            if not options["no_reconcile"]:
+                # оплаченные, но без webhook записи сначала подтверждаются
+                try:
+                    reconcile_payments(older_than=timedelta(minutes=options["deadline"]))
+                except PaymentError as error:
+                    self.stderr.write(f"Сверка с ЮKassa не удалась: {error}")
+            expired = expire_unpaid_bookings(
+                deadline_minutes=options["deadline"], batch_size=options["batch_size"],
+            )
+            if expired or not options["loop"]:
+                self.stdout.write(f"Отменено записей: {expired}")
+            if not options["loop"]:
+                return
+            time_module.sleep(options["interval"])
@@ -0,0 +1,34 @@
+"""
+Генерация смен из недельных шаблонов:
+    python manage.py generate_shifts --weeks 4
+    python manage.py generate_shifts --from 2026-03-01 --to 2026-03-31
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.shift_templates import generate_shifts
+
+from .rebuild_availability import parse_date
+
+
+class Command(BaseCommand):
+    help = "Создать смены мастеров по недельным шаблонам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="Первая дата, по умолчанию сегодня")
+        parser.add_argument("--to", dest="date_to", help="Последняя дата")
+        parser.add_argument("--weeks", type=int, default=4, help="Сколько недель, если --to не указан")
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options["date_from"]) if options["date_from"] else timezone.localdate()
+        if options["date_to"]:
+            date_to = parse_date(options["date_to"])
+        else:
+            date_to = date_from + timedelta(weeks=options["weeks"], days=-1)
+        if date_to < date_from:
+            raise CommandError("--to раньше --from")
+
+        created = generate_shifts(date_from=date_from, date_to=date_to)
+        self.stdout.write(self.style.SUCCESS(f"Создано смен: {created} ({date_from} — {date_to})"))
@@ -0,0 +1,28 @@
+"""
+Обработка очереди уведомлений ЮKassa (core.payment_inbox):
+    python manage.py process_payment_notifications
+    python manage.py process_payment_notifications --loop --interval 2
+"""
+import time as time_module
+
+from django.core.management.base import BaseCommand
+
+from core.payment_inbox import PAYMENT_INBOX_BATCH_SIZE, process_all_notifications
+
+
+class Command(BaseCommand):
+    help = "Применить накопленные уведомления ЮKassa к записям"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PAYMENT_INBOX_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Работать постоянно")
+        parser.add_argument("--interval", type=float, default=2, help="Пауза при пустой очереди, сек")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_all_notifications(options["batch_size"])
+            if processed or not options["loop"]:
+                self.stdout.write(f"Обработано уведомлений: {processed}")
+            if not options["loop"]:
+                return
+            time_module.sleep(options["interval"])
@@ -0,0 +1,50 @@
+"""
+Пересборка и проверка масок доступности мастеров:
+    python manage.py rebuild_availability --from 2026-02-01 --to 2026-02-28
+    python manage.py rebuild_availability --check
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.availability import EMPTY_DAY, compute_days, find_inconsistent_days, save_days
+from core.models import SpecialistDayAvailability
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Некорректная дата: {value} (нужен формат YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Пересобрать маски доступности мастеров или сверить их со сменами и записями"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="Первая дата, по умолчанию сегодня")
+        parser.add_argument("--to", dest="date_to", help="Последняя дата, по умолчанию +60 дней")
+        parser.add_argument("--check", action="store_true", help="Только сверить, ничего не записывая")
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options["date_from"]) if options["date_from"] else timezone.localdate()
+        date_to = parse_date(options["date_to"]) if options["date_to"] else date_from + timedelta(days=60)
+        if date_to < date_from:
+            raise CommandError("--to раньше --from")
+
+        if options["check"]:
+            problems = find_inconsistent_days(date_from=date_from, date_to=date_to)
+            for salon_id, specialist_id, day, reason in problems:
+                self.stdout.write(f"{day} салон={salon_id} мастер={specialist_id}: {reason}")
+            if problems:
+                raise CommandError(f"Расхождений: {len(problems)}")
+            self.stdout.write(self.style.SUCCESS("Маски доступности совпадают с расписанием"))
+            return
+
+        days = compute_days(date_from=date_from, date_to=date_to)
+        stale = SpecialistDayAvailability.objects.filter(
+            date__gte=date_from, date__lte=date_to,
+        ).values_list("salon_id", "specialist_id", "date")
+        save_days({**{key: EMPTY_DAY for key in stale}, **days})
+        self.stdout.write(self.style.SUCCESS(f"Пересобрано дней: {len(days)}"))
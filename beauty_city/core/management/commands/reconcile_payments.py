@@ -0,0 +1,33 @@
+"""
+Сверка зависших платежей с ЮKassa (core.payment_reconcile):
+    python manage.py reconcile_payments
+    python manage.py reconcile_payments --older-than 30 --workers 4
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.payment_reconcile import RECONCILE_BATCH_SIZE, reconcile_payments
+
+
+class Command(BaseCommand):
+    help = "Запросить в ЮKassa статусы неподтверждённых платежей и применить их к записям"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=10, help="Записи старше N минут")
+        parser.add_argument("--workers", type=int, help="Параллельных запросов, по умолчанию YOOKASSA_POOL_SIZE")
+        parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["workers"] is not None and options["workers"] < 1:
+            raise CommandError("--workers должно быть не меньше 1")
+
+        stats = reconcile_payments(
+            older_than=timedelta(minutes=options["older_than"]),
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(
+            f"Проверено: {sum(stats.values())}, оплачено: {stats['succeeded']}, "
+            f"отменено: {stats['canceled']}, ошибок: {stats[None]}"
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_merge_20260124_1349'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecialistDayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('shift_bits', models.BinaryField(verbose_name='Рабочие интервалы')),
+                ('free_bits', models.BinaryField(verbose_name='Свободные интервалы')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('salon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='core.salon')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='core.specialist')),
+            ],
+            options={
+                'verbose_name': 'Доступность мастера на день',
+                'verbose_name_plural': 'Доступность мастеров по дням',
+                'constraints': [models.UniqueConstraint(fields=('salon', 'specialist', 'date'), name='uniq_specialist_day_availability')],
+            },
+        ),
+    ]
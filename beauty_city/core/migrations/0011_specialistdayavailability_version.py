@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_specialistdayavailability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='specialistdayavailability',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_specialistdayavailability_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Бронь до'),
+        ),
+        migrations.AddField(
+            model_name='specialistdayavailability',
+            name='holds_expire_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Ближайшее истечение брони'),
+        ),
+    ]
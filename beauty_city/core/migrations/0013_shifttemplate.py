@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_booking_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('start_time', models.TimeField(verbose_name='С')),
+                ('end_time', models.TimeField(verbose_name='До')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('salon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_templates', to='core.salon')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_templates', to='core.specialist')),
+            ],
+            options={
+                'verbose_name': 'Шаблон смены',
+                'verbose_name_plural': 'Шаблоны смен',
+                'ordering': ['specialist', 'weekday', 'start_time'],
+                'constraints': [models.UniqueConstraint(fields=('salon', 'specialist', 'weekday', 'start_time', 'end_time'), name='uniq_shift_template')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_shifttemplate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='max_redemptions',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто — без ограничения', null=True, verbose_name='Максимум использований'),
+        ),
+        migrations.AddField(
+            model_name='promocode',
+            name='per_phone_limit',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Пусто — без ограничения', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Использований на телефон'),
+        ),
+        migrations.AddField(
+            model_name='promocode',
+            name='redemptions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Использовано'),
+        ),
+        migrations.CreateModel(
+            name='PromoCodeUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, verbose_name='Телефон')),
+                ('redemptions', models.PositiveIntegerField(default=0, verbose_name='Использовано')),
+                ('promo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='core.promocode')),
+            ],
+            options={
+                'verbose_name': 'Использование промокода',
+                'verbose_name_plural': 'Использования промокодов',
+                'constraints': [models.UniqueConstraint(fields=('promo', 'phone'), name='uniq_promo_usage_phone')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_promo_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Оплачена'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='ID платежа'),
+        ),
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=50, verbose_name='Событие')),
+                ('payment_id', models.CharField(max_length=100, verbose_name='ID платежа')),
+                ('status', models.CharField(blank=True, max_length=30, verbose_name='Статус платежа')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+            ],
+            options={
+                'verbose_name': 'Уведомление об оплате',
+                'verbose_name_plural': 'Уведомления об оплате',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='payment_notification_pending')],
+                'constraints': [models.UniqueConstraint(fields=('payment_id', 'event'), name='uniq_payment_notification')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_payment_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentnotification',
+            name='problem',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Проблема'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_paymentnotification_problem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='payment_attempt',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Попытка оплаты'),
+        ),
+    ]
@@ -140,6 +140,51 @@ class WorkShift(models.Model):
     def __str__(self):
         return f"{self.date} {self.start_time}-{self.end_time}: {self.specialist} ({self.salon})"
 
+    def overlapping_shifts(self):
+        """Другие смены мастера в этот день, пересекающиеся с этой (в любом салоне)."""
+        return WorkShift.objects.filter(
+            specialist_id=self.specialist_id,
+            date=self.date,
+            start_time__lt=self.end_time,
+            end_time__gt=self.start_time,
+        ).exclude(pk=self.pk).select_related("salon")
+
+
+class ShiftTemplate(models.Model):
+    """
+    Недельный шаблон расписания: в какие дни недели и часы мастер работает в салоне.
+    По шаблонам генерируются смены WorkShift (core/shift_templates.py).
+    """
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, "Понедельник"
+        TUESDAY = 1, "Вторник"
+        WEDNESDAY = 2, "Среда"
+        THURSDAY = 3, "Четверг"
+        FRIDAY = 4, "Пятница"
+        SATURDAY = 5, "Суббота"
+        SUNDAY = 6, "Воскресенье"
+
+    salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name="shift_templates")
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name="shift_templates")
+    weekday = models.PositiveSmallIntegerField("День недели", choices=Weekday.choices)
+    start_time = models.TimeField("С")
+    end_time = models.TimeField("До")
+    is_active = models.BooleanField("Активен", default=True)
+
+    class Meta:
+        verbose_name = "Шаблон смены"
+        verbose_name_plural = "Шаблоны смен"
+        ordering = ["specialist", "weekday", "start_time"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["salon", "specialist", "weekday", "start_time", "end_time"],
+                name="uniq_shift_template"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start_time}-{self.end_time}: {self.specialist} ({self.salon})"
+
 
 class PromoCode(models.Model):
     """
@@ -155,6 +200,16 @@ class PromoCode(models.Model):
     is_active = models.BooleanField("Активен", default=True)
     valid_from = models.DateField("Действует с", blank=True, null=True)
     valid_to = models.DateField("Действует по", blank=True, null=True)
+    max_redemptions = models.PositiveIntegerField(
+        "Максимум использований", blank=True, null=True,
+        help_text="Пусто — без ограничения",
+    )
+    per_phone_limit = models.PositiveSmallIntegerField(
+        "Использований на телефон", blank=True, null=True,
+        validators=[MinValueValidator(1)],
+        help_text="Пусто — без ограничения",
+    )
+    redemptions_count = models.PositiveIntegerField("Использовано", default=0, editable=False)
 
     class Meta:
         verbose_name = "Промокод"
@@ -175,6 +230,26 @@ class PromoCode(models.Model):
         return True
 
 
+class PromoCodeUsage(models.Model):
+    """
+    Сколько раз промокод использован с одного телефона.
+    Счётчик увеличивается только условным UPDATE (core.promo_codes.redeem_promo).
+    """
+    promo = models.ForeignKey(PromoCode, on_delete=models.CASCADE, related_name="usages")
+    phone = models.CharField("Телефон", max_length=20)
+    redemptions = models.PositiveIntegerField("Использовано", default=0)
+
+    class Meta:
+        verbose_name = "Использование промокода"
+        verbose_name_plural = "Использования промокодов"
+        constraints = [
+            models.UniqueConstraint(fields=["promo", "phone"], name="uniq_promo_usage_phone")
+        ]
+
+    def __str__(self):
+        return f"{self.promo.code} — {self.phone}"
+
+
 class ConsentDocument(models.Model):
     title = models.CharField("Название", max_length=200, default="Согласие на обработку персональных данных")
     file = models.FileField("PDF файл", upload_to="consents/")
@@ -223,6 +298,19 @@ class CustomerProfile(models.Model):
         return f"{self.user}"
 
 
+class BookingQuerySet(models.QuerySet):
+    def blocking(self, at=None):
+        """
+        Записи, которые занимают время мастера: не отменённые и без истёкшей брони
+        (бронь истекает, если до hold_expires_at так и не начали оплату).
+        """
+        at = at or timezone.now()
+        return self.exclude(status=Booking.Status.CANCELED).exclude(
+            hold_expires_at__lte=at,
+            payment_id="",
+        )
+
+
 class Booking(models.Model):
     class Source(models.TextChoices):
         WEB = "web", "Сайт"
@@ -253,7 +341,12 @@ class Booking(models.Model):
 
     created_at = models.DateTimeField("Создана", auto_now_add=True)
 
-    payment_id = models.CharField('ID платежа', max_length=100, blank=True)
+    payment_id = models.CharField('ID платежа', max_length=100, blank=True, db_index=True)
+    payment_attempt = models.PositiveIntegerField("Попытка оплаты", default=0, editable=False)
+    paid_at = models.DateTimeField("Оплачена", null=True, blank=True)
+    hold_expires_at = models.DateTimeField("Бронь до", null=True, blank=True)
+
+    objects = BookingQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Запись"
@@ -268,6 +361,15 @@ class Booking(models.Model):
     def __str__(self):
         return f"{self.start_at:%Y-%m-%d %H:%M} — {self.procedure} ({self.salon})"
 
+    @property
+    def hold_expired(self) -> bool:
+        """Бронь истекла, а оплату так и не начали — время уже не за клиентом."""
+        return bool(
+            self.hold_expires_at
+            and not self.payment_id
+            and self.hold_expires_at <= timezone.now()
+        )
+
     @property
     def discount_percent(self) -> int:
         if not self.promo_code:
@@ -275,6 +377,41 @@ class Booking(models.Model):
         return int(self.promo_code.discount_percent)
 
 
+class PaymentNotification(models.Model):
+    """
+    Входящие уведомления ЮKassa. Webhook только кладёт уведомление сюда,
+    статусы записей меняет обработчик пачками (core.payment_inbox).
+    Повтор того же события по платежу не создаёт новой строки.
+    problem — уведомление обработано, но применить его не удалось
+    (например, оплачена отменённая запись): нужен менеджер.
+    """
+    event = models.CharField("Событие", max_length=50)
+    payment_id = models.CharField("ID платежа", max_length=100)
+    status = models.CharField("Статус платежа", max_length=30, blank=True)
+    payload = models.JSONField("Данные", default=dict)
+    received_at = models.DateTimeField("Получено", auto_now_add=True)
+    processed_at = models.DateTimeField("Обработано", null=True, blank=True)
+    problem = models.CharField("Проблема", max_length=200, blank=True)
+
+    class Meta:
+        verbose_name = "Уведомление об оплате"
+        verbose_name_plural = "Уведомления об оплате"
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(fields=["payment_id", "event"], name="uniq_payment_notification")
+        ]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="payment_notification_pending",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event} — {self.payment_id}"
+
+
 class SiteSettings(models.Model):
     """
     Чтобы "показать номер менеджера" и хранить 1-2 глобальные настройки.
@@ -288,3 +425,36 @@ class SiteSettings(models.Model):
 
     def __str__(self):
         return "Настройки сайта"
+
+
+class SpecialistDayAvailability(models.Model):
+    """
+    Материализованная доступность мастера в салоне на день.
+    Сутки разбиты на 5-минутные интервалы, каждый интервал — один бит:
+    shift_bits — мастер работает, free_bits — работает и не занят записью.
+    version растёт при каждом изменении смен и записей дня (ключ кэша слотов).
+    holds_expire_at — когда истечёт ближайшая неоплаченная бронь: после этого
+    строка пересчитывается при следующем чтении.
+    Обновляется сигналами (core/signals.py), пересобирается командой rebuild_availability.
+    """
+    salon = models.ForeignKey(Salon, on_delete=models.CASCADE, related_name="day_availability")
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name="day_availability")
+    date = models.DateField("Дата")
+    shift_bits = models.BinaryField("Рабочие интервалы")
+    free_bits = models.BinaryField("Свободные интервалы")
+    version = models.PositiveIntegerField("Версия", default=0)
+    holds_expire_at = models.DateTimeField("Ближайшее истечение брони", null=True, blank=True)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Доступность мастера на день"
+        verbose_name_plural = "Доступность мастеров по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["salon", "specialist", "date"],
+                name="uniq_specialist_day_availability"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.specialist} ({self.salon})"
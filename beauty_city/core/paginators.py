@@ -0,0 +1,41 @@
+"""
+Paginator для больших таблиц в админке.
+
+Полный COUNT(*) по таблице записей дорог, поэтому число строк считается
+не дальше count_cap: SELECT COUNT(*) FROM (... LIMIT count_cap + 1).
+На PostgreSQL для выборки без фильтров берётся оценка из pg_class.reltuples,
+если она больше предела. Число страниц в этих случаях приблизительное.
+"""
+from functools import cached_property
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+
+
+class CappedCountPaginator(Paginator):
+    count_cap = 10_000
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if not isinstance(object_list, QuerySet):
+            return super().count
+        estimate = _estimated_rows(object_list)
+        if estimate is not None and estimate > self.count_cap:
+            return estimate
+        return object_list[:self.count_cap + 1].count()
+
+
+def _estimated_rows(queryset):
+    """Оценка числа строк таблицы от планировщика PostgreSQL или None."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql" or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
@@ -0,0 +1,126 @@
+"""
+Очередь уведомлений ЮKassa.
+
+Webhook делает один INSERT ... ON CONFLICT DO NOTHING в PaymentNotification
+и сразу отвечает, поэтому всплеск уведомлений принимается за постоянное
+время, а повторы от ЮKassa ничего не стоят. Обработчик
+(manage.py process_payment_notifications) забирает пачку и применяет её
+несколькими UPDATE на всю пачку:
+    payment.succeeded — неотменённая запись подтверждается, ставится paid_at;
+    payment.canceled  — у новой записи снимается payment_id (следующая
+                        попытка оплаты получит новый ключ), и время
+                        освобождается, когда истечёт бронь.
+Остальные события просто помечаются обработанными. Оплата, для которой нет
+неотменённой записи (запись отменили или платёж не найден), пишется в лог
+с ошибкой, а уведомление получает problem — деньги нужно вернуть вручную.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.timezone import localtime
+
+from .availability import refresh_days
+from .models import Booking, PaymentNotification
+from .payments import forget_booking_payments, release_canceled_payments
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_INBOX_BATCH_SIZE = getattr(settings, "PAYMENT_INBOX_BATCH_SIZE", 500)
+UNMATCHED_PAYMENT_PROBLEM = "Оплата без неотменённой записи: запись отменена или не найдена"
+
+
+def enqueue_notification(data):
+    """Положить уведомление в очередь; бросает ValueError, если в нём нет платежа."""
+    payment = data.get("object") or {}
+    payment_id = payment.get("id")
+    if not payment_id:
+        raise ValueError("В уведомлении нет object.id")
+    status = payment.get("status", "")
+    PaymentNotification.objects.bulk_create(
+        [PaymentNotification(
+            event=data.get("event") or f"payment.{status}",
+            payment_id=payment_id,
+            status=status,
+            payload=data,
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def apply_payment_statuses(statuses, at=None):
+    """
+    Применить статусы платежей {payment_id: status} к записям — по UPDATE
+    на каждый вид перехода. Общая часть обработчика очереди и сверки с ЮKassa
+    (core.payment_reconcile). Возвращает дни для refresh_days и оплаченные
+    платежи, у которых нет неотменённой записи.
+    """
+    at = at or timezone.now()
+    succeeded = {payment_id for payment_id, status in statuses.items() if status == "succeeded"}
+    canceled = {payment_id for payment_id, status in statuses.items() if status == "canceled"}
+
+    # подтверждение не меняет занятость мастера, маски пересчитывать не нужно;
+    # запись, подтверждённую в админке до оплаты, остаётся отметить оплаченной
+    unmatched = set()
+    if succeeded:
+        paid = Booking.objects.filter(payment_id__in=succeeded).exclude(status=Booking.Status.CANCELED)
+        paid.update(status=Booking.Status.CONFIRMED, paid_at=Coalesce(F("paid_at"), Value(at)))
+        unmatched = succeeded - set(paid.values_list("payment_id", flat=True))
+        if unmatched:
+            logger.error("%s: %s", UNMATCHED_PAYMENT_PROBLEM, ", ".join(sorted(unmatched)))
+    if not canceled:
+        return set(), unmatched
+
+    released = Booking.objects.filter(payment_id__in=canceled, status=Booking.Status.NEW).order_by()
+    rows = list(released.values_list("pk", "salon_id", "specialist_id", "start_at"))
+    release_canceled_payments(released)
+    forget_booking_payments([pk for pk, *_ in rows])
+    days = {
+        (salon_id, specialist_id, localtime(start_at).date())
+        for _, salon_id, specialist_id, start_at in rows
+        if specialist_id
+    }
+    return days, unmatched
+
+
+def process_notifications(batch_size=PAYMENT_INBOX_BATCH_SIZE):
+    """Обработать одну пачку уведомлений; возвращает её размер."""
+    with transaction.atomic():
+        pending = PaymentNotification.objects.filter(processed_at__isnull=True).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            # несколько обработчиков не берут одну и ту же пачку
+            pending = pending.select_for_update(skip_locked=True)
+        batch = list(pending.values_list("id", "event", "payment_id")[:batch_size])
+        if not batch:
+            return 0
+
+        statuses = {}
+        for _, event, payment_id in batch:
+            if event in ("payment.succeeded", "payment.canceled"):
+                # успешная оплата важнее отмены из той же пачки
+                if statuses.get(payment_id) != "succeeded":
+                    statuses[payment_id] = event.removeprefix("payment.")
+        processed_at = timezone.now()
+        days, unmatched = apply_payment_statuses(statuses, at=processed_at)
+        handled = PaymentNotification.objects.filter(pk__in=[pk for pk, _, _ in batch])
+        handled.update(processed_at=processed_at)
+        if unmatched:
+            handled.filter(event="payment.succeeded", payment_id__in=unmatched).update(
+                problem=UNMATCHED_PAYMENT_PROBLEM,
+            )
+
+    refresh_days(days)
+    return len(batch)
+
+
+def process_all_notifications(batch_size=PAYMENT_INBOX_BATCH_SIZE):
+    """Разобрать очередь до конца; возвращает число обработанных уведомлений."""
+    total = 0
+    while True:
+        processed = process_notifications(batch_size)
+        total += processed
+        if processed < batch_size:
+            return total
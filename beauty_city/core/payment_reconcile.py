@@ -0,0 +1,65 @@
+"""
+Сверка зависших платежей с ЮKassa.
+
+Если webhook потерялся, запись так и остаётся новой с payment_id. Сверка
+перебирает такие записи пачками по id, статусы платежей пачки
+запрашивает в ограниченном пуле потоков (соединения — из пула клиента
+core.payments) и применяет их тем же apply_payment_statuses, что и
+обработчик очереди уведомлений: несколько UPDATE на пачку.
+
+    python manage.py reconcile_payments --older-than 10 --workers 8
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import refresh_days
+from .models import Booking
+from .payment_inbox import apply_payment_statuses
+from .payments import PaymentError, get_client
+
+RECONCILE_BATCH_SIZE = 500
+
+
+def fetch_payment_statuses(payment_ids, *, workers):
+    """{payment_id: status}; платежи, которые не удалось запросить, — со статусом None."""
+    client = get_client()
+
+    def fetch(payment_id):
+        try:
+            return payment_id, client.get_payment(payment_id).status
+        except PaymentError:
+            return payment_id, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(fetch, payment_ids))
+
+
+def reconcile_payments(*, older_than=timedelta(minutes=10), workers=None, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Сверить новые записи с payment_id, созданные раньше older_than назад.
+    Возвращает Counter по статусам платежей (None — ошибка запроса).
+    """
+    workers = workers or getattr(settings, "YOOKASSA_POOL_SIZE", 10)
+    pending = Booking.objects.filter(
+        status=Booking.Status.NEW,
+        created_at__lte=timezone.now() - older_than,
+    ).exclude(payment_id="")
+
+    stats = Counter()
+    last_pk = 0
+    while True:
+        rows = list(pending.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "payment_id")[:batch_size])
+        if not rows:
+            return stats
+        last_pk = rows[-1][0]
+
+        statuses = fetch_payment_statuses({payment_id for _, payment_id in rows}, workers=workers)
+        stats.update(statuses.values())
+        with transaction.atomic():
+            days, _ = apply_payment_statuses(statuses)
+        refresh_days(days)
@@ -2,16 +2,13 @@
 Платежи через ЮKassa - простая кнопка на сайте
 """
 import json
-from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import redirect, get_object_or_404
-from yookassa import Configuration, Payment as YooPayment
 from .models import Booking
-
-
-Configuration.account_id = settings.YOOKASSA_SHOP_ID
-Configuration.secret_key = settings.YOOKASSA_SECRET_KEY
+from .payment_inbox import enqueue_notification
+from .payments import PaymentError, forget_booking_payments, get_booking_payment, release_canceled_payments
+from .reservations import SlotUnavailable, hold_slot
 
 
 def create_payment(request, booking_id):
@@ -20,64 +17,60 @@ def create_payment(request, booking_id):
     URL: /create-payment/{booking_id}/
     """
 
-    booking = get_object_or_404(Booking, id=booking_id)
+    booking = get_object_or_404(Booking.objects.select_related('procedure'), id=booking_id)
 
 
-    if booking.status == 'confirmed':
+    if booking.status == Booking.Status.CONFIRMED:
         return redirect('/?error=already_paid')
 
-    # Создаем платеж в ЮKassa
-    payment = YooPayment.create({
-        "amount": {
-            "value": f"{float(booking.price_final):.2f}",
-            "currency": "RUB"
-        },
-        "confirmation": {
-            "type": "redirect",
-            "return_url": f"{settings.SITE_URL}/payment-success/"
-        },
-        "description": f"Запись #{booking_id} - {booking.procedure.title}",
-        "metadata": {
-            "booking_id": booking_id,
-            "customer": booking.customer_name
-        }
-    })
-
-    # Сохраняем ID платежа
-    booking.payment_id = payment.id
-    booking.save()
+    # Отменённую запись (не оплатили вовремя, отменил администратор) оплатить нельзя
+    if booking.status == Booking.Status.CANCELED:
+        return redirect('/?error=booking_canceled')
 
+    # Бронь истекла, пока не начали оплату — заново проверяем, что время свободно
+    if booking.hold_expired:
+        try:
+            hold_slot(booking)
+        except SlotUnavailable:
+            return redirect('/service/?error=slot_taken')
+
+    # Платеж в ЮKassa: повторные нажатия получают ту же ссылку (см. core.payments)
+    try:
+        payment = get_booking_payment(booking)
+        if payment.status == 'canceled':
+            # По ссылке отменённого платежа не заплатить — снимаем его с записи
+            # и один раз пробуем создать новый (у него уже другой ключ)
+            release_canceled_payments(Booking.objects.filter(pk=booking.pk, payment_id=payment.id))
+            forget_booking_payments([booking.pk])
+            payment = get_booking_payment(booking)
+    except PaymentError as error:
+        print(f"❌ Ошибка ЮKassa: {error}")
+        return redirect('/?error=payment_unavailable')
+
+    if payment.status == 'canceled':
+        forget_booking_payments([booking.pk])
+        return redirect('/?error=payment_unavailable')
+
+    if payment.status in ('succeeded', 'waiting_for_capture'):
+        return redirect('/?error=already_paid')
 
-    return redirect(payment.confirmation.confirmation_url)
+    return redirect(payment.confirmation_url)
 
 
 @csrf_exempt
 def yookassa_webhook(request):
     """
-    Получаем уведомления от ЮKassa об оплате
+    Получаем уведомления от ЮKassa об оплате и кладём их в очередь
+    (статусы записей меняет process_payment_notifications)
     URL: /yookassa-webhook/
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            payment_id = data.get('object', {}).get('id')
-            status = data.get('object', {}).get('status')
-
-            print(f"💰 Получен платеж: {payment_id} - статус: {status}")
-
-
-            if status == 'succeeded':
-                try:
-                    booking = Booking.objects.get(payment_id=payment_id)
-                    booking.status = 'confirmed'
-                    booking.save()
-                    print(f"✅ Запись #{booking.id} оплачена")
-                except:
-                    print(f"⚠️ Запись не найдена")
-
+            enqueue_notification(data)
             return JsonResponse({'status': 'ok'})
 
-        except Exception as e:
+        except (ValueError, AttributeError) as e:
             print(f"❌ Ошибка: {e}")
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -0,0 +1,258 @@
+"""
+HTTP-клиент ЮKassa для создания платежей.
+
+Один requests.Session на процесс: соединения к API держатся открытыми
+(keep-alive) в пуле HTTPAdapter, у каждого запроса есть таймауты на
+соединение и чтение. Ошибки сети и ответы 429/5xx повторяются ограниченное
+число раз с backoff; повтор POST безопасен, потому что ЮKassa дедуплицирует
+запросы по заголовку Idempotence-Key. Медленный провайдер больше не держит
+воркер дольше YOOKASSA_TIMEOUT × (YOOKASSA_MAX_RETRIES + 1).
+
+Платёж за запись создаётся идемпотентно (get_booking_payment): ключ
+выводится из записи, ссылка на оплату живёт в кэше PAYMENT_CONFIRMATION_TTL
+секунд, а одновременные запросы по одной записи ждут того, кто уже
+обращается к ЮKassa, — наружу уходит один запрос.
+
+Для ASGI есть aget_booking_payment — тот же get_booking_payment в потоке,
+цикл событий не блокируется. acreate_payment — низкоуровневый вызов без
+ключа записи, кэша и блокировки: для оплаты записи его не используют.
+"""
+import hashlib
+import threading
+import time as time_module
+import uuid
+from typing import NamedTuple
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .models import Booking
+
+YOOKASSA_API_URL = "https://api.yookassa.ru/v3"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+PAYMENT_CACHE_ALIAS = getattr(settings, "PAYMENT_CACHE_ALIAS", "default")
+PAYMENT_CONFIRMATION_TTL = getattr(settings, "PAYMENT_CONFIRMATION_TTL", 10 * 60)
+PAYMENT_LOCK_TIMEOUT = 60
+PAYMENT_POLL_INTERVAL = 0.05
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class PaymentError(Exception):
+    """ЮKassa не ответила или отклонила запрос."""
+
+
+class CreatedPayment(NamedTuple):
+    id: str
+    status: str
+    confirmation_url: str
+
+
+def _created_payment(data):
+    return CreatedPayment(
+        id=data["id"],
+        status=data.get("status", ""),
+        confirmation_url=(data.get("confirmation") or {}).get("confirmation_url", ""),
+    )
+
+
+class YooKassaClient:
+    def __init__(self, *, api_url, shop_id, secret_key, timeout=(3.05, 10), max_retries=2, pool_size=10):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = (shop_id, secret_key)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.2,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, *, json=None, idempotence_key=None):
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else {}
+        try:
+            response = self.session.request(
+                method, f"{self.api_url}{path}", json=json, headers=headers, timeout=self.timeout,
+            )
+        except requests.RequestException as error:
+            raise PaymentError(f"ЮKassa недоступна: {error}") from error
+        if response.status_code != 200:
+            try:
+                description = response.json().get("description", "")
+            except ValueError:
+                description = response.text[:200]
+            raise PaymentError(f"ЮKassa ответила {response.status_code}: {description}")
+        return response.json()
+
+    def create_payment(self, payload, *, idempotence_key):
+        data = self.request("POST", "/payments", json=payload, idempotence_key=idempotence_key)
+        return _created_payment(data)
+
+    def get_payment(self, payment_id):
+        return _created_payment(self.request("GET", f"/payments/{payment_id}"))
+
+    def close(self):
+        self.session.close()
+
+
+def get_client():
+    """Клиент процесса; создаётся при первом обращении по текущим настройкам."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not settings.YOOKASSA_SHOP_ID or not settings.YOOKASSA_SECRET_KEY:
+                    raise PaymentError("Не заданы ключи ЮKassa")
+                _client = YooKassaClient(
+                    api_url=getattr(settings, "YOOKASSA_API_URL", YOOKASSA_API_URL),
+                    shop_id=settings.YOOKASSA_SHOP_ID,
+                    secret_key=settings.YOOKASSA_SECRET_KEY,
+                    timeout=getattr(settings, "YOOKASSA_TIMEOUT", (3.05, 10)),
+                    max_retries=getattr(settings, "YOOKASSA_MAX_RETRIES", 2),
+                    pool_size=getattr(settings, "YOOKASSA_POOL_SIZE", 10),
+                )
+    return _client
+
+
+def close_client():
+    """Закрыть соединения; следующий get_client() перечитает настройки."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def booking_payment_payload(booking):
+    return {
+        "amount": {
+            "value": f"{float(booking.price_final):.2f}",
+            "currency": "RUB",
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": f"{settings.SITE_URL}/payment-success/",
+        },
+        "description": f"Запись #{booking.pk} - {booking.procedure.title}",
+        "metadata": {
+            "booking_id": booking.pk,
+            "customer": booking.customer_name,
+        },
+    }
+
+
+def create_payment(payload, idempotence_key=None):
+    """Создать платёж по готовому телу запроса; бросает PaymentError."""
+    return get_client().create_payment(payload, idempotence_key=idempotence_key or str(uuid.uuid4()))
+
+
+def create_booking_payment(booking, idempotence_key=None):
+    return create_payment(booking_payment_payload(booking), idempotence_key)
+
+
+# Низкоуровневый вызов: тело собрано заранее, в потоке остаётся только
+# HTTP-запрос. Без idempotence_key каждый вызов создаёт новый платёж —
+# платёж за запись берут через aget_booking_payment
+acreate_payment = sync_to_async(create_payment, thread_sensitive=False)
+
+
+def booking_idempotence_key(booking):
+    """
+    Ключ попытки оплаты записи: запись, сумма и номер попытки.
+    Повторы дают тот же ключ, а после отмены платежа ключ новый
+    (release_canceled_payments увеличивает payment_attempt).
+    """
+    raw = f"booking:{booking.pk}:{booking.price_final:.2f}:{booking.payment_attempt}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def release_canceled_payments(bookings):
+    """
+    Снять отменённый платёж с записей queryset: payment_id очищается (бронь
+    снова истекает по hold_expires_at), а номер попытки растёт — иначе новый
+    платёж ушёл бы с прежним Idempotence-Key, и ЮKassa вернула бы отменённый.
+    Возвращает число записей.
+    """
+    return bookings.update(payment_id="", payment_attempt=F("payment_attempt") + 1)
+
+
+def payment_cache_key(booking_id):
+    return f"payment:booking:{booking_id}"
+
+
+def forget_booking_payments(booking_ids):
+    """Сбросить закэшированные ссылки на оплату (платёж отменён или запись закрыта)."""
+    caches[PAYMENT_CACHE_ALIAS].delete_many([payment_cache_key(booking_id) for booking_id in booking_ids])
+
+
+def get_booking_payment(booking):
+    """
+    Платёж для оплаты записи. Ссылка берётся из кэша; без кэша неотменённый
+    платёж booking.payment_id переиспользуется, иначе создаётся новый и
+    сохраняется в запись. Бросает PaymentError, в том числе если запись отменена.
+    """
+    cache = caches[PAYMENT_CACHE_ALIAS]
+    key = payment_cache_key(booking.pk)
+    lock_key = f"{key}:lock"
+
+    deadline = time_module.monotonic() + PAYMENT_LOCK_TIMEOUT
+    while True:
+        cached = cache.get(key)
+        if cached is not None:
+            return CreatedPayment(*cached)
+        if cache.add(lock_key, 1, PAYMENT_LOCK_TIMEOUT):
+            break
+        if time_module.monotonic() >= deadline:
+            raise PaymentError("Платёж по записи уже создаётся, попробуйте позже")
+        time_module.sleep(PAYMENT_POLL_INTERVAL)
+
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            return CreatedPayment(*cached)
+
+        # пока ждали блокировку, платёж мог создать другой процесс
+        booking.refresh_from_db(fields=["payment_id", "payment_attempt", "price_final", "status"])
+        if booking.status == Booking.Status.CANCELED:
+            raise PaymentError("Запись отменена")
+        payment = None
+        if booking.payment_id:
+            payment = get_client().get_payment(booking.payment_id)
+            if payment.status == "canceled":
+                # то же, что уведомление об отмене; если оно уже применено, запрос ничего не меняет
+                release_canceled_payments(Booking.objects.filter(pk=booking.pk, payment_id=booking.payment_id))
+                booking.refresh_from_db(fields=["payment_id", "payment_attempt"])
+                payment = None
+        if payment is None:
+            payment = create_booking_payment(booking, booking_idempotence_key(booking))
+            # запись могли отменить, пока шёл запрос к ЮKassa: тогда ссылку не отдаём,
+            # и неоплаченный платёж ЮKassa отменит сама
+            saved = Booking.objects.filter(pk=booking.pk).exclude(status=Booking.Status.CANCELED).update(
+                payment_id=payment.id,
+            )
+            if not saved:
+                raise PaymentError("Запись отменена")
+            booking.payment_id = payment.id
+
+        cache.set(key, tuple(payment), PAYMENT_CONFIRMATION_TTL)
+        return payment
+    finally:
+        cache.delete(lock_key)
+
+
+# get_booking_payment ходит в базу, поэтому поток — общий для запроса
+# (thread_sensitive), как у остальных ORM-вызовов из async-кода
+aget_booking_payment = sync_to_async(get_booking_payment)
@@ -0,0 +1,73 @@
+"""
+Цены процедур по салонам.
+
+Цена в салоне берётся из ProcedureOffering, если она задана, иначе —
+Procedure.base_price. Вся матрица читается одним запросом и лежит в
+общем кэше под версией каталога (core.catalog): изменения процедур и
+предложений салонов меняют версию, и следующий запрос строит матрицу
+заново.
+"""
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.core.cache import caches
+
+from .catalog import CATALOG_CACHE_ALIAS, CATALOG_CACHE_TIMEOUT, get_catalog_version
+from .models import Procedure
+
+
+class PriceMatrix(NamedTuple):
+    base_prices: dict
+    salon_prices: dict
+
+    def price(self, salon_id, procedure_id):
+        """Действующая цена; None, если процедуры нет."""
+        if (salon_id, procedure_id) in self.salon_prices:
+            return self.salon_prices[(salon_id, procedure_id)]
+        return self.base_prices.get(procedure_id)
+
+
+def load_price_matrix():
+    """Базовые цены и цены салонов одним запросом (LEFT JOIN на offerings)."""
+    base_prices = {}
+    salon_prices = {}
+    for procedure_id, base_price, salon_id, price in Procedure.objects.order_by().values_list(
+        "pk", "base_price", "offerings__salon_id", "offerings__price"
+    ):
+        base_prices[procedure_id] = base_price
+        if salon_id is not None:
+            salon_prices[(salon_id, procedure_id)] = price
+    return PriceMatrix(base_prices, salon_prices)
+
+
+def get_price_matrix():
+    cache = caches[CATALOG_CACHE_ALIAS]
+    key = f"pricing:matrix:{get_catalog_version()}"
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = load_price_matrix()
+        cache.set(key, matrix, CATALOG_CACHE_TIMEOUT)
+    return matrix
+
+
+def get_price(salon, procedure):
+    """Цена процедуры в салоне; без салона — базовая."""
+    if salon is None:
+        return procedure.base_price
+    price = get_price_matrix().price(salon.pk, procedure.pk)
+    return procedure.base_price if price is None else price
+
+
+def apply_discount(price, discount_percent):
+    """Цена со скидкой в процентах, с точностью до копеек."""
+    discount = price * Decimal(discount_percent) / Decimal(100)
+    return (price - discount).quantize(Decimal("0.01"))
+
+
+def annotate_prices(procedures, salon):
+    """Проставить procedure.price для списка процедур в выбранном салоне."""
+    matrix = get_price_matrix() if salon is not None else None
+    for procedure in procedures:
+        price = matrix.price(salon.pk, procedure.pk) if matrix else None
+        procedure.price = procedure.base_price if price is None else price
+    return procedures
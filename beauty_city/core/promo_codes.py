@@ -0,0 +1,128 @@
+"""
+Индекс активных промокодов в памяти процесса и списание использований.
+
+Коды хранятся в casefold, поэтому проверка регистронезависима и
+сводится к поиску в словаре. Индекс перечитывается целиком (одним
+запросом) после сохранения или удаления промокода (core/signals.py)
+и не реже чем раз в PROMO_INDEX_TIMEOUT секунд.
+
+Лимиты (max_redemptions, per_phone_limit) индекс не проверяет — их
+соблюдает redeem_promo условными UPDATE в транзакции сохранения записи.
+Отменённые неоплаченные записи возвращают использования
+(release_promo_redemptions).
+"""
+from collections import Counter
+from datetime import date
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .local_cache import LocalValue
+from .models import PromoCode, PromoCodeUsage
+
+PROMO_INDEX_TIMEOUT = getattr(settings, "PROMO_INDEX_TIMEOUT", 60)
+
+
+class PromoUnavailable(Exception):
+    """Промокод не найден, неактивен или вне срока действия."""
+
+
+class PromoEntry(NamedTuple):
+    pk: int
+    code: str
+    discount_percent: int
+    valid_from: date | None
+    valid_to: date | None
+
+
+def load_promo_index():
+    return {
+        code.casefold(): PromoEntry(pk, code, discount_percent, valid_from, valid_to)
+        for pk, code, discount_percent, valid_from, valid_to in PromoCode.objects.filter(
+            Q(max_redemptions__isnull=True) | Q(redemptions_count__lt=F("max_redemptions")),
+            is_active=True,
+        ).values_list("pk", "code", "discount_percent", "valid_from", "valid_to")
+    }
+
+
+_promo_index = LocalValue(load_promo_index, PROMO_INDEX_TIMEOUT)
+
+
+def find_promo(code, today=None):
+    """Действующий промокод по коду в любом регистре; иначе PromoUnavailable."""
+    promo = _promo_index.get().get((code or "").strip().casefold())
+    if promo is None:
+        raise PromoUnavailable("Промокод не найден или неактивен")
+
+    today = today or timezone.localdate()
+    if promo.valid_from and promo.valid_from > today:
+        raise PromoUnavailable("Промокод ещё не активен")
+    if promo.valid_to and promo.valid_to < today:
+        raise PromoUnavailable("Срок действия промокода истёк")
+    return promo
+
+
+def clear_promo_index(**kwargs):
+    _promo_index.clear()
+
+
+def redeem_promo(promo_id, phone):
+    """
+    Списать одно использование промокода с телефона phone.
+    Общий счётчик и счётчик телефона растут условным UPDATE ... WHERE
+    счётчик < лимита, без чтения и записи в два шага, поэтому лимит не
+    превышается и при параллельных записях. Вызывать внутри транзакции
+    сохранения записи: PromoUnavailable откатывает уже списанное.
+    """
+    taken = PromoCode.objects.filter(
+        Q(max_redemptions__isnull=True) | Q(redemptions_count__lt=F("max_redemptions")),
+        pk=promo_id,
+        is_active=True,
+    ).update(redemptions_count=F("redemptions_count") + 1)
+    if not taken:
+        clear_promo_index()
+        raise PromoUnavailable("Промокод закончился")
+
+    # лимит читается заранее: с JOIN к промокоду UPDATE превращается в
+    # WHERE id IN (SELECT ...), а подзапрос после ожидания блокировки строки
+    # PostgreSQL (READ COMMITTED) не перепроверяет — лимит можно превысить
+    per_phone_limit = PromoCode.objects.filter(pk=promo_id).values_list("per_phone_limit", flat=True).get()
+    usage = PromoCodeUsage.objects.filter(promo_id=promo_id, phone=phone)
+    if per_phone_limit is not None:
+        usage = usage.filter(redemptions__lt=per_phone_limit)
+    if usage.update(redemptions=F("redemptions") + 1):
+        return
+    try:
+        with transaction.atomic():
+            PromoCodeUsage.objects.create(promo_id=promo_id, phone=phone, redemptions=1)
+    except IntegrityError:
+        # строка уже есть: либо лимит исчерпан, либо её только что создал параллельный запрос
+        if not usage.update(redemptions=F("redemptions") + 1):
+            raise PromoUnavailable("Промокод уже использован с этого номера")
+
+
+def release_promo_redemptions(redemptions):
+    """
+    Вернуть использования отменённых записей; redemptions — пары
+    (promo_id, phone), по одной на запись. Один UPDATE на телефон и один
+    на промокод, счётчики не опускаются ниже нуля.
+    """
+    counts = Counter(redemptions)
+    if not counts:
+        return
+    per_promo = Counter()
+    for (promo_id, phone), count in counts.items():
+        per_promo[promo_id] += count
+        PromoCodeUsage.objects.filter(promo_id=promo_id, phone=phone).update(
+            redemptions=Greatest(F("redemptions") - count, 0),
+        )
+    for promo_id, count in per_promo.items():
+        PromoCode.objects.filter(pk=promo_id).update(
+            redemptions_count=Greatest(F("redemptions_count") - count, 0),
+        )
+    # исчерпанный промокод мог снова стать доступным
+    clear_promo_index()
@@ -0,0 +1,82 @@
+"""
+Атомарная бронь времени мастера.
+
+Проверка «время свободно» и сохранение записи выполняются в одной транзакции
+под блокировкой мастера: SELECT ... FOR UPDATE по строке Specialist там, где
+база это умеет, и общий процессный замок на SQLite (вместе с
+transaction_mode=IMMEDIATE в настройках это сериализует запись и между
+процессами). Время проверяется по сменам салона записи и по записям мастера
+во всех салонах: мастер со сменами в двух салонах не может быть занят
+дважды. Новая запись держит время до hold_expires_at; если оплату
+к этому моменту не начали, бронь перестаёт занимать слот сама.
+Промокод новой записи списывается в той же транзакции.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Booking, Specialist
+from .promo_codes import redeem_promo
+from .slots import get_available_slots
+
+BOOKING_HOLD_MINUTES = getattr(settings, "BOOKING_HOLD_MINUTES", 15)
+
+_serial_lock = threading.Lock()
+
+
+class SlotUnavailable(Exception):
+    """Выбранное время уже занято или недоступно."""
+
+
+@contextmanager
+def specialist_lock(specialist_id):
+    """Транзакция, в которой никто другой не бронирует время этого мастера."""
+    if connection.features.has_select_for_update:
+        with transaction.atomic():
+            list(Specialist.objects.select_for_update().filter(pk=specialist_id).values_list("pk"))
+            yield
+    else:
+        with _serial_lock, transaction.atomic():
+            yield
+
+
+def hold_slot(booking, hold_minutes=None):
+    """
+    Забронировать время записи booking (salon, specialist, procedure, start_at
+    уже заполнены) и сохранить её. Возвращает booking с hold_expires_at.
+    Бросает SlotUnavailable, если время занято или не попадает в смену,
+    и PromoUnavailable, если у промокода новой записи исчерпан лимит.
+    """
+    hold_minutes = BOOKING_HOLD_MINUTES if hold_minutes is None else hold_minutes
+    local_start = timezone.localtime(booking.start_at)
+
+    with specialist_lock(booking.specialist_id):
+        free_times = get_available_slots(
+            salon=booking.salon,
+            specialist=booking.specialist,
+            procedure=booking.procedure,
+            date=local_start.date(),
+        )
+        if local_start.time() not in free_times:
+            raise SlotUnavailable("Это время уже занято, выберите другое")
+
+        # get_available_slots видит только записи этого салона
+        booking.end_at = booking.start_at + timedelta(minutes=booking.procedure.duration_minutes)
+        overlapping = Booking.objects.blocking().filter(
+            specialist_id=booking.specialist_id, start_at__lt=booking.end_at, end_at__gt=booking.start_at,
+        )
+        if booking.pk is not None:
+            overlapping = overlapping.exclude(pk=booking.pk)
+        if overlapping.exists():
+            raise SlotUnavailable("Это время уже занято, выберите другое")
+
+        booking.hold_expires_at = timezone.now() + timedelta(minutes=hold_minutes)
+        if booking.pk is None and booking.promo_code_id:
+            redeem_promo(booking.promo_code_id, booking.phone)
+        booking.save()
+
+    return booking
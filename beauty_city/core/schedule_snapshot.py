@@ -0,0 +1,200 @@
+"""
+Снимок дня салона в памяти: по строке поминутной занятости на мастера.
+
+Строка — 1440 булевых значений (минуты суток), матрица — все мастера
+салона сразу. Свободные окна длиной duration_minutes ищутся векторно
+(границы рабочих серий и префиксные суммы по всей матрице), без цикла
+по мастерам, как в core.slots. Для расписаний, выровненных по минутам,
+результат совпадает с core.slots.get_salon_availability (записи нулевой
+длины не учитываются).
+
+Построение матрицы стоит дороже цикла по мастерам, пока мастеров мало:
+по bench_snapshot (шаг 30 минут, построение + поиск) снимок медленнее
+при 5–10 мастерах (x0.5–0.9), сравнивается с циклом около 20–100 и даёт
+до x1.5 при 100–300. Поэтому страница записи берёт снимок только
+от SNAPSHOT_MIN_SPECIALISTS мастеров (get_any_master_availability).
+
+Бенчмарк: python manage.py bench_snapshot --specialists 10 100 300
+"""
+from datetime import datetime, time, timedelta
+from functools import cached_property
+
+import numpy as np
+from django.conf import settings
+from django.utils.timezone import localtime, make_aware, now
+
+from .slots import SLOT_STEP_MINUTES, get_salon_availability, load_schedule, salon_specialists
+
+SNAPSHOT_MIN_SPECIALISTS = getattr(settings, "SNAPSHOT_MIN_SPECIALISTS", 100)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTE = timedelta(minutes=1)
+
+
+def _interval_matrix(rows_count, rows, starts, ends):
+    """
+    Булева матрица (rows_count, MINUTES_PER_DAY) из интервалов [начало, конец)
+    в минутах: разностный массив и накопленная сумма вместо поминутной заливки.
+    Лишний последний столбец гасит серии строки, поэтому сумма идёт по
+    плоскому массиву целиком — это заметно быстрее, чем по оси строк.
+    """
+    width = MINUTES_PER_DAY + 1
+    diff = np.zeros(rows_count * width, dtype=np.int16)
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, MINUTES_PER_DAY)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), 0, MINUTES_PER_DAY)
+    valid = starts < ends
+    np.add.at(diff, rows[valid] * width + starts[valid], 1)
+    np.add.at(diff, rows[valid] * width + ends[valid], -1)
+    return (np.cumsum(diff, dtype=np.int16) > 0).reshape(rows_count, width)[:, :-1]
+
+
+class SalonDaySnapshot:
+    """
+    Занятость мастеров салона за один день.
+    work — минуты внутри смен, busy — минуты, задетые записями.
+    """
+
+    def __init__(self, *, date, specialists, work, busy):
+        self.date = date
+        self.specialists = list(specialists)
+        self.work = work
+        self.busy = busy
+
+    @cached_property
+    def _runs(self):
+        """Рабочие серии: массивы (строка, начало, конец); не зависят от процедуры."""
+        padded = np.zeros((len(self.specialists), MINUTES_PER_DAY + 2), dtype=bool)
+        padded[:, 1:-1] = self.work
+        edges = np.flatnonzero(padded[:, 1:] != padded[:, :-1])
+        # начала и концы серий чередуются внутри строки
+        rows, minutes = np.divmod(edges, MINUTES_PER_DAY + 1)
+        return rows[0::2], minutes[0::2], minutes[1::2]
+
+    @cached_property
+    def _busy_prefix(self):
+        """Префиксные суммы занятых минут по плоской матрице busy."""
+        prefix = np.zeros(self.busy.size + 1, dtype=np.int32)
+        np.cumsum(self.busy, out=prefix[1:])
+        return prefix
+
+    @classmethod
+    def from_schedule(cls, *, date, specialists, shifts_by_day, bookings_by_day):
+        """Снимок из словарей core.slots.load_schedule."""
+        specialists = list(specialists)
+        day_start = make_aware(datetime.combine(date, time.min))
+
+        # смена занимает только целые минуты внутри себя, запись — все задетые
+        shift_rows, shift_starts, shift_ends = [], [], []
+        booking_rows, booking_starts, booking_ends = [], [], []
+        for row, specialist in enumerate(specialists):
+            key = (specialist.pk, date)
+            for shift_start, shift_end in shifts_by_day.get(key, ()):
+                if not isinstance(shift_start, time) or not isinstance(shift_end, time):
+                    continue
+                shift_rows.append(row)
+                shift_starts.append(-(-_time_seconds(shift_start) // 60))
+                shift_ends.append(_time_seconds(shift_end) // 60)
+            booked = bookings_by_day.get(key)
+            if booked:
+                booking_rows.extend([row] * len(booked))
+                booking_starts.extend([(b_start - day_start) // MINUTE for b_start, _ in booked])
+                booking_ends.extend([-((day_start - b_end) // MINUTE) for _, b_end in booked])
+
+        rows_count = len(specialists)
+        return cls(
+            date=date,
+            specialists=specialists,
+            work=_interval_matrix(rows_count, shift_rows, shift_starts, shift_ends),
+            busy=_interval_matrix(rows_count, booking_rows, booking_starts, booking_ends),
+        )
+
+    def start_positions(self, duration_minutes, *, now_dt=None, step_minutes=SLOT_STEP_MINUTES):
+        """
+        Свободные начала как два массива (строка мастера, минута),
+        отсортированные по минуте, затем по строке. Кандидаты, как и
+        в core.slots, идут с шагом step_minutes от начала каждой рабочей
+        серии; занятость окна проверяется по префиксным суммам busy.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        if not self.specialists or duration_minutes <= 0:
+            return empty, empty
+
+        run_rows, run_starts, run_ends = self._runs
+        counts = np.maximum((run_ends - run_starts - duration_minutes) // step_minutes + 1, 0)
+        runs = np.repeat(np.arange(len(run_starts)), counts)
+        offsets = np.arange(len(runs)) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = run_rows[runs]
+        minutes = run_starts[runs] + offsets * step_minutes
+
+        # окно целиком внутри строки, поэтому суммы по плоскому массиву корректны
+        flat = rows * MINUTES_PER_DAY + minutes
+        free = self._busy_prefix[flat + duration_minutes] == self._busy_prefix[flat]
+        if now_dt is not None:
+            day_start = make_aware(datetime.combine(self.date, time.min))
+            free &= minutes * 60 >= (now_dt - day_start).total_seconds()
+
+        rows, minutes = rows[free], minutes[free]
+        order = np.lexsort((rows, minutes))
+        return rows[order], minutes[order]
+
+    def availability(self, duration_minutes, *, now_dt=None, step_minutes=SLOT_STEP_MINUTES):
+        """Пары (time, [specialist, ...]) по возрастанию времени — как get_salon_availability."""
+        rows, minutes = self.start_positions(duration_minutes, now_dt=now_dt, step_minutes=step_minutes)
+        slot_minutes, first_index = np.unique(minutes, return_index=True)
+        bounds = [*first_index.tolist(), len(rows)]
+        rows = rows.tolist()
+        return [
+            (time(minute // 60, minute % 60), [self.specialists[row] for row in rows[bounds[i]:bounds[i + 1]]])
+            for i, minute in enumerate(slot_minutes.tolist())
+        ]
+
+
+def _time_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def build_salon_snapshot(*, salon, date, procedure=None, specialists=None):
+    """
+    Снимок дня салона: смены и записи всех мастеров — по одному запросу.
+    Без specialists берутся мастера салона, которые делают procedure.
+    """
+    if specialists is None:
+        specialists = salon_specialists(salon=salon, procedure=procedure)
+    specialists = list(specialists)
+    shifts_by_day, bookings_by_day = load_schedule(
+        salon=salon,
+        specialist_ids=[specialist.pk for specialist in specialists],
+        date_from=date,
+        date_to=date,
+    )
+    return SalonDaySnapshot.from_schedule(
+        date=date,
+        specialists=specialists,
+        shifts_by_day=shifts_by_day,
+        bookings_by_day=bookings_by_day,
+    )
+
+
+def get_salon_availability_vectorized(*, salon, procedure, date, specialists=None):
+    """Режим «любой мастер» на снимке дня: тот же результат, что get_salon_availability."""
+    if specialists is not None:
+        specialists = list(specialists)
+        if not specialists:
+            return []
+    snapshot = build_salon_snapshot(salon=salon, date=date, procedure=procedure, specialists=specialists)
+    return snapshot.availability(procedure.duration_minutes, now_dt=localtime(now()))
+
+
+def get_any_master_availability(*, salon, procedure, date, specialists, min_specialists=None):
+    """
+    Режим «любой мастер» для страницы записи: цикл по мастерам
+    (get_salon_availability), а от min_specialists мастеров — снимок дня.
+    """
+    specialists = list(specialists)
+    min_specialists = SNAPSHOT_MIN_SPECIALISTS if min_specialists is None else min_specialists
+    if len(specialists) >= min_specialists:
+        return get_salon_availability_vectorized(
+            salon=salon, procedure=procedure, date=date, specialists=specialists,
+        )
+    return get_salon_availability(salon=salon, procedure=procedure, date=date, specialists=specialists)
@@ -0,0 +1,61 @@
+"""
+Генерация смен WorkShift из недельных шаблонов ShiftTemplate.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from .availability import refresh_days
+from .models import ShiftTemplate, WorkShift
+
+GENERATE_BATCH_SIZE = 500
+
+
+def generate_shifts(*, date_from, date_to, templates=None, batch_size=GENERATE_BATCH_SIZE):
+    """
+    Развернуть шаблоны в смены на даты [date_from, date_to].
+
+    Уже существующие смены (те же салон, мастер, дата и время —
+    uniq_shift_exact) пропускаются: они читаются одним запросом заранее,
+    а ignore_conflicts страхует от параллельной генерации.
+    Новые смены пишутся одним bulk_create на каждые batch_size строк.
+    Возвращает количество созданных смен.
+    """
+    if templates is None:
+        templates = ShiftTemplate.objects.filter(is_active=True)
+    templates_by_weekday = defaultdict(list)
+    for template in templates:
+        templates_by_weekday[template.weekday].append(template)
+    if not templates_by_weekday or date_to < date_from:
+        return 0
+
+    existing = set(
+        WorkShift.objects.filter(
+            date__gte=date_from,
+            date__lte=date_to,
+            specialist_id__in={t.specialist_id for ts in templates_by_weekday.values() for t in ts},
+        ).values_list("salon_id", "specialist_id", "date", "start_time", "end_time")
+    )
+
+    new_shifts = []
+    day = date_from
+    while day <= date_to:
+        for template in templates_by_weekday.get(day.weekday(), ()):
+            key = (template.salon_id, template.specialist_id, day, template.start_time, template.end_time)
+            if key in existing:
+                continue
+            existing.add(key)
+            new_shifts.append(WorkShift(
+                salon_id=template.salon_id,
+                specialist_id=template.specialist_id,
+                date=day,
+                start_time=template.start_time,
+                end_time=template.end_time,
+            ))
+        day += timedelta(days=1)
+
+    for offset in range(0, len(new_shifts), batch_size):
+        WorkShift.objects.bulk_create(new_shifts[offset:offset + batch_size], ignore_conflicts=True)
+
+    # bulk_create не шлёт сигналы — обновляем доступность сами
+    refresh_days({(shift.salon_id, shift.specialist_id, shift.date) for shift in new_shifts})
+    return len(new_shifts)
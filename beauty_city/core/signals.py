@@ -0,0 +1,93 @@
+"""
+Сигналы, поддерживающие производные данные в актуальном состоянии.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.timezone import localtime
+
+from .availability import refresh_days
+from .catalog import bump_catalog_version
+from .models import (
+    Booking, Procedure, ProcedureOffering, PromoCode, Salon, SiteSettings,
+    Specialist, SpecialistSalon, WorkShift,
+)
+from .promo_codes import clear_promo_index
+from .site_settings import clear_site_settings_cache
+from .thumbnails import DERIVATIVE_FIELDS, make_thumbnails
+
+
+def _booking_days(booking):
+    if not booking.specialist_id or not booking.start_at:
+        return set()
+    return {(booking.salon_id, booking.specialist_id, localtime(booking.start_at).date())}
+
+
+def _shift_days(shift):
+    return {(shift.salon_id, shift.specialist_id, shift.date)}
+
+
+DAY_KEYS = {
+    Booking: _booking_days,
+    WorkShift: _shift_days,
+}
+
+
+@receiver(pre_save, sender=Booking)
+@receiver(pre_save, sender=WorkShift)
+def remember_previous_day(sender, instance, **kwargs):
+    """Запомнить день до изменения: запись или смену могли перенести."""
+    instance._previous_days = set()
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_days = DAY_KEYS[sender](previous)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=WorkShift)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=WorkShift)
+def refresh_day_availability(sender, instance, **kwargs):
+    """Пересчитать маски доступности затронутых дней (в т.ч. при отмене записи)."""
+    days = DAY_KEYS[sender](instance) | getattr(instance, "_previous_days", set())
+    refresh_days(days)
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def reset_site_settings(sender, **kwargs):
+    clear_site_settings_cache()
+
+
+@receiver(post_save, sender=Salon)
+@receiver(post_save, sender=Procedure)
+@receiver(post_save, sender=Specialist)
+@receiver(post_save, sender=SpecialistSalon)
+@receiver(post_save, sender=ProcedureOffering)
+@receiver(post_delete, sender=Salon)
+@receiver(post_delete, sender=Procedure)
+@receiver(post_delete, sender=Specialist)
+@receiver(post_delete, sender=SpecialistSalon)
+@receiver(post_delete, sender=ProcedureOffering)
+def reset_catalog_fragments(sender, **kwargs):
+    """
+    Каталог изменился — фрагменты главной и матрица цен (core.pricing)
+    с прежней версией больше не читаются.
+    """
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=PromoCode)
+@receiver(post_delete, sender=PromoCode)
+def reset_promo_index(sender, **kwargs):
+    clear_promo_index()
+
+
+@receiver(post_save, sender=Salon)
+@receiver(post_save, sender=Procedure)
+@receiver(post_save, sender=Specialist)
+def create_thumbnails(sender, instance, **kwargs):
+    """Уменьшенные копии фото создаются сразу после загрузки (core.thumbnails)."""
+    for model, field_name, responsive in DERIVATIVE_FIELDS:
+        if model is sender:
+            make_thumbnails(getattr(instance, field_name), responsive=responsive)
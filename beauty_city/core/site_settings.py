@@ -0,0 +1,24 @@
+"""
+Настройки сайта (SiteSettings) из памяти процесса.
+
+Запись читается один раз и живёт до сохранения или удаления (сигналы
+сбрасывают кэш) либо до SITE_SETTINGS_CACHE_TIMEOUT секунд — так
+остальные воркеры тоже подхватывают изменения из админки.
+"""
+from django.conf import settings
+
+from .local_cache import LocalValue
+from .models import SiteSettings
+
+SITE_SETTINGS_CACHE_TIMEOUT = getattr(settings, "SITE_SETTINGS_CACHE_TIMEOUT", 60)
+
+_site_settings = LocalValue(lambda: SiteSettings.objects.first(), SITE_SETTINGS_CACHE_TIMEOUT)
+
+
+def get_site_settings():
+    """Единственная запись SiteSettings или None; без запроса, если кэш тёплый."""
+    return _site_settings.get()
+
+
+def clear_site_settings_cache(**kwargs):
+    _site_settings.clear()
@@ -0,0 +1,143 @@
+"""
+Кэш свободных слотов поверх core.slots.get_available_slots.
+
+Ключ: салон, мастер, длительность процедуры, дата и версия дня мастера
+(SpecialistDayAvailability.version). Сигналы записей и смен поднимают версию,
+поэтому устаревшее значение никогда не читается — оно просто вытесняется по
+таймауту. Одновременные промахи по одному ключу считаются один раз:
+внутри процесса через общий Event, между процессами — через короткую
+блокировку cache.add (работает и с locmem, и с файловым кэшем).
+"""
+import threading
+import time as time_module
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.timezone import localtime, now
+
+from .availability import get_day_version
+from .slots import get_available_slots
+
+SLOT_CACHE_ALIAS = getattr(settings, "SLOT_CACHE_ALIAS", "default")
+SLOT_CACHE_TIMEOUT = getattr(settings, "SLOT_CACHE_TIMEOUT", 10 * 60)
+SLOT_CACHE_LOCK_TIMEOUT = 10
+SLOT_CACHE_POLL_INTERVAL = 0.05
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cache_stats():
+    """Счётчики: hits, misses, coalesced (дождались чужого расчёта)."""
+    with _stats_lock:
+        return {name: _stats[name] for name in ("hits", "misses", "coalesced")}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def slot_cache_key(*, salon_id, specialist_id, duration_minutes, date, version):
+    return f"slots:{salon_id}:{specialist_id}:{duration_minutes}:{date:%Y%m%d}:v{version}"
+
+
+def _drop_past(times, date):
+    """Кэш мог быть посчитан раньше: убираем уже прошедшие сегодня слоты."""
+    current = localtime(now())
+    if date != current.date():
+        return list(times)
+    return [slot_time for slot_time in times if slot_time >= current.time()]
+
+
+def get_cached_slots(*, salon, specialist, procedure, date):
+    """Как get_available_slots, но через версионированный кэш."""
+    cache = caches[SLOT_CACHE_ALIAS]
+    version = get_day_version(salon.pk, specialist.pk, date)
+    key = slot_cache_key(
+        salon_id=salon.pk,
+        specialist_id=specialist.pk,
+        duration_minutes=procedure.duration_minutes,
+        date=date,
+        version=version,
+    )
+
+    cached = cache.get(key)
+    if cached is not None:
+        _count("hits")
+        return _drop_past(cached, date)
+
+    def compute():
+        return get_available_slots(salon=salon, specialist=specialist, procedure=procedure, date=date)
+
+    return _drop_past(_single_flight(cache, key, compute), date)
+
+
+def _single_flight(cache, key, compute):
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+
+    if not leader:
+        _count("coalesced")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _compute_once(cache, key, compute)
+        return flight.result
+    except Exception as error:
+        flight.error = error
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+
+def _compute_once(cache, key, compute):
+    """Межпроцессная часть: считает тот, кто взял блокировку, остальные ждут значение."""
+    lock_key = f"{key}:lock"
+    deadline = time_module.monotonic() + SLOT_CACHE_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, SLOT_CACHE_LOCK_TIMEOUT)
+    while not locked:
+        cached = cache.get(key)
+        if cached is not None:
+            _count("coalesced")
+            return cached
+        if time_module.monotonic() >= deadline:
+            break
+        time_module.sleep(SLOT_CACHE_POLL_INTERVAL)
+        locked = cache.add(lock_key, 1, SLOT_CACHE_LOCK_TIMEOUT)
+
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            _count("hits")
+            return cached
+        _count("misses")
+        value = compute()
+        cache.set(key, value, SLOT_CACHE_TIMEOUT)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
@@ -1,8 +1,13 @@
+from bisect import bisect_left
+from calendar import monthrange
+from collections import defaultdict
 from datetime import datetime, time, timedelta
 from django.utils.timezone import make_aware, now, localtime
-from .models import WorkShift, Booking
+from .models import WorkShift, Booking, Specialist
 
 SLOT_STEP_MINUTES = 30
+NEXT_SLOTS_HORIZON_DAYS = 60
+NEXT_SLOTS_FIRST_BATCH_DAYS = 7
 
 
 def get_available_slots(*, salon, specialist, procedure, date):
@@ -14,41 +19,304 @@ def get_available_slots(*, salon, specialist, procedure, date):
     - конкретной даты
     """
 
-    shifts = WorkShift.objects.filter(
-        salon=salon,
-        specialist=specialist,
+    shifts = list(
+        WorkShift.objects.filter(
+            salon=salon,
+            specialist=specialist,
+            date=date,
+        ).order_by("start_time").values_list("start_time", "end_time")
+    )
+
+    if not shifts:
+        return []
+
+    day_start = make_aware(datetime.combine(date, time.min))
+    day_end = make_aware(datetime.combine(date, time.max))
+
+    booked_intervals = list(
+        Booking.objects.filter(
+            salon=salon,
+            specialist=specialist,
+            start_at__gte=day_start,
+            start_at__lte=day_end,
+        ).blocking().values_list("start_at", "end_at")
+    )
+
+    return scan_slot_times(
         date=date,
-    ).order_by("start_time")
+        shifts=shifts,
+        booked_intervals=booked_intervals,
+        duration=timedelta(minutes=procedure.duration_minutes),
+        now_dt=localtime(now()),
+    )
 
-    if not shifts.exists():
+
+def get_salon_availability(*, salon, procedure, date, specialists=None):
+    """
+    Режим «любой мастер»: свободные времена по всем мастерам салона.
+
+    Возвращает список пар (time, [specialist, ...]) по возрастанию времени.
+    Смены и записи всех мастеров читаются одним запросом каждые, поэтому
+    число запросов не зависит от количества мастеров в салоне.
+    Можно передать уже загруженный список specialists, тогда запрос
+    мастеров не выполняется.
+    """
+    if specialists is None:
+        specialists = salon_specialists(salon=salon, procedure=procedure)
+    specialists_by_id = {specialist.pk: specialist for specialist in specialists}
+    if not specialists_by_id:
         return []
 
+    shifts_by_day, bookings_by_day = load_schedule(
+        salon=salon, specialist_ids=specialists_by_id, date_from=date, date_to=date,
+    )
+
     duration = timedelta(minutes=procedure.duration_minutes)
-    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    now_dt = localtime(now())
 
-    day_start = make_aware(datetime.combine(date, time.min))
-    day_end = make_aware(datetime.combine(date, time.max))
+    free_by_time = defaultdict(list)
+    for specialist_id, specialist in specialists_by_id.items():
+        key = (specialist_id, date)
+        if key not in shifts_by_day:
+            continue
+        slot_times = scan_slot_times(
+            date=date,
+            shifts=shifts_by_day[key],
+            booked_intervals=bookings_by_day[key],
+            duration=duration,
+            now_dt=now_dt,
+        )
+        for slot_time in slot_times:
+            free_by_time[slot_time].append(specialist)
 
-    bookings = Booking.objects.filter(
-        salon=salon,
-        specialist=specialist,
-        start_at__gte=day_start,
-        start_at__lte=day_end,
-    ).exclude(status=Booking.Status.CANCELED)
+    return [(slot_time, free_by_time[slot_time]) for slot_time in sorted(free_by_time)]
+
+
+def find_next_slots(*, salon, procedure, specialist=None, start_date=None,
+                    days=NEXT_SLOTS_HORIZON_DAYS, limit=1):
+    """
+    Ближайшие свободные времена на горизонте days дней начиная со start_date.
+
+    Возвращает до limit троек (date, time, specialist) по возрастанию.
+    Без specialist ищет по всем мастерам салона, делающим процедуру.
+    Смены и записи читаются окнами по датам, каждое следующее окно вдвое
+    длиннее предыдущего (7, 14, 28… дней), поэтому даже у мастера, занятого
+    на недели вперёд, число запросов ограничено: 2 на окно, ≤ 8 на 60 дней
+    (плюс запрос мастеров, если specialist не передан).
+    """
+    start_date = start_date or localtime(now()).date()
+    if specialist is not None:
+        specialists = [specialist]
+    else:
+        specialists = list(salon_specialists(salon=salon, procedure=procedure))
+    specialists_by_id = {item.pk: item for item in specialists}
+    if not specialists_by_id or days <= 0 or limit <= 0:
+        return []
+
+    duration = timedelta(minutes=procedure.duration_minutes)
+    now_dt = localtime(now())
+    last_date = start_date + timedelta(days=days - 1)
+
+    found = []
+    window_from = start_date
+    window_days = NEXT_SLOTS_FIRST_BATCH_DAYS
+    while window_from <= last_date:
+        window_to = min(window_from + timedelta(days=window_days - 1), last_date)
+        shifts_by_day, bookings_by_day = load_schedule(
+            salon=salon, specialist_ids=specialists_by_id, date_from=window_from, date_to=window_to,
+        )
+
+        day = window_from
+        while day <= window_to:
+            day_slots = []
+            for specialist_id, item in specialists_by_id.items():
+                key = (specialist_id, day)
+                if key not in shifts_by_day:
+                    continue
+                slot_times = scan_slot_times(
+                    date=day,
+                    shifts=shifts_by_day[key],
+                    booked_intervals=bookings_by_day[key],
+                    duration=duration,
+                    now_dt=now_dt,
+                )
+                day_slots.extend((slot_time, item) for slot_time in slot_times)
+
+            day_slots.sort(key=lambda slot: slot[0])
+            for slot_time, item in day_slots:
+                found.append((day, slot_time, item))
+                if len(found) >= limit:
+                    return found
+            day += timedelta(days=1)
+
+        window_from = window_to + timedelta(days=1)
+        window_days *= 2
+
+    return found
+
+
+def count_month_slots(*, salon, procedure, year, month, specialist=None):
+    """
+    Число свободных времён на каждый день месяца — для календаря записи.
+
+    Возвращает {date: count} по всем дням месяца; без specialist считаются
+    различные времена, свободные хотя бы у одного мастера салона.
+    Смены и записи за месяц читаются одним запросом каждые и разбираются
+    за один проход по дням.
+    """
+    if specialist is not None:
+        specialists = [specialist]
+    else:
+        specialists = list(salon_specialists(salon=salon, procedure=procedure))
+
+    first_day = datetime(year, month, 1).date()
+    last_day = first_day.replace(day=monthrange(year, month)[1])
+    counts = {first_day + timedelta(days=offset): 0 for offset in range(last_day.day)}
+    if not specialists:
+        return counts
 
-    booked_intervals = [(b.start_at, b.end_at) for b in bookings]
+    shifts_by_day, bookings_by_day = load_schedule(
+        salon=salon,
+        specialist_ids=[item.pk for item in specialists],
+        date_from=first_day,
+        date_to=last_day,
+    )
 
+    duration = timedelta(minutes=procedure.duration_minutes)
     now_dt = localtime(now())
+
+    free_by_day = defaultdict(set)
+    for (specialist_id, day), shifts in shifts_by_day.items():
+        free_by_day[day].update(scan_slot_times(
+            date=day,
+            shifts=shifts,
+            booked_intervals=bookings_by_day[(specialist_id, day)],
+            duration=duration,
+            now_dt=now_dt,
+        ))
+
+    for day, times in free_by_day.items():
+        counts[day] = len(times)
+    return counts
+
+
+def salon_specialists(*, salon, procedure):
+    """Активные мастера салона, которые делают процедуру."""
+    return Specialist.objects.filter(
+        is_active=True,
+        salons__salon=salon,
+        procedures=procedure,
+    ).distinct()
+
+
+def load_schedule(*, salon, specialist_ids, date_from, date_to):
+    """
+    Смены и записи мастеров салона за диапазон дат — по одному запросу.
+    Возвращает два словаря {(specialist_id, date): [(начало, конец), ...]}:
+    смены (time) и занимающие время записи (datetime), записи — по дате начала.
+    """
+    shifts_by_day = defaultdict(list)
+    shift_rows = WorkShift.objects.filter(
+        salon=salon,
+        specialist_id__in=specialist_ids,
+        date__gte=date_from,
+        date__lte=date_to,
+    ).order_by("date", "start_time").values_list("specialist_id", "date", "start_time", "end_time")
+    for specialist_id, day, start_time, end_time in shift_rows:
+        shifts_by_day[(specialist_id, day)].append((start_time, end_time))
+
+    bookings_by_day = defaultdict(list)
+    if not shifts_by_day:
+        return shifts_by_day, bookings_by_day
+
+    booking_rows = Booking.objects.filter(
+        salon=salon,
+        specialist_id__in={specialist_id for specialist_id, _ in shifts_by_day},
+        start_at__gte=make_aware(datetime.combine(date_from, time.min)),
+        start_at__lte=make_aware(datetime.combine(date_to, time.max)),
+    ).blocking().order_by().values_list("specialist_id", "start_at", "end_at")
+    for specialist_id, start_at, end_at in booking_rows:
+        bookings_by_day[(specialist_id, localtime(start_at).date())].append((start_at, end_at))
+
+    return shifts_by_day, bookings_by_day
+
+
+def merge_shifts(shifts):
+    """
+    Нормализация смен дня: пересекающиеся и стыкующиеся интервалы
+    (start_time, end_time) склеиваются, пустые и некорректные отбрасываются.
+    """
+    valid = sorted(
+        (start, end) for start, end in shifts
+        if isinstance(start, time) and isinstance(end, time) and start < end
+    )
+    merged = []
+    for start, end in valid:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def scan_slot_times(*, date, shifts, booked_intervals, duration, now_dt, step=None):
+    """
+    Свободные времена начала внутри смен (sweep по отсортированным записям).
+
+    shifts — пары (start_time, end_time), booked_intervals — пары
+    (start_at, end_at). Смены сначала склеиваются (merge_shifts), поэтому
+    пересекающиеся смены не дают повторных времён и каждая минута
+    проходится один раз. Записи сортируются один раз, для каждого кандидата
+    бинарным поиском находится префикс записей, начавшихся до конца кандидата,
+    и сравнивается максимальный конец в этом префиксе с началом кандидата.
+    Итого O((C + B) log B) вместо O(C × B) у прямого перебора.
+    """
+    step = step or timedelta(minutes=SLOT_STEP_MINUTES)
+    shifts = merge_shifts(shifts)
+
+    booked = sorted(booked_intervals)
+    starts = [b_start for b_start, _ in booked]
+    max_ends = []
+    for _, b_end in booked:
+        max_ends.append(b_end if not max_ends or b_end > max_ends[-1] else max_ends[-1])
+
+    available_times = []
+
+    for shift_start, shift_end in shifts:
+        current_start = make_aware(datetime.combine(date, shift_start))
+        shift_end = make_aware(datetime.combine(date, shift_end))
+
+        while current_start + duration <= shift_end:
+            if current_start >= now_dt:
+                current_end = current_start + duration
+                idx = bisect_left(starts, current_end)
+                if not idx or max_ends[idx - 1] <= current_start:
+                    available_times.append(current_start.time())
+
+            current_start += step
+
+    available_times.sort()
+    return available_times
+
+
+def scan_slot_times_naive(*, date, shifts, booked_intervals, duration, now_dt, step=None):
+    """
+    Прямой перебор «каждый кандидат × каждая запись», без склейки смен.
+    Эталон для дифференциального теста и бенчмарка scan_slot_times:
+    на merge_shifts(shifts) результаты совпадают.
+    """
+    step = step or timedelta(minutes=SLOT_STEP_MINUTES)
     available_times = []
 
-    for shift in shifts:
-        if not isinstance(shift.start_time, time) or not isinstance(shift.end_time, time):
+    for shift_start, shift_end in shifts:
+        if not isinstance(shift_start, time) or not isinstance(shift_end, time):
             continue
-        if shift.start_time >= shift.end_time:
+        if shift_start >= shift_end:
             continue
 
-        current_start = make_aware(datetime.combine(date, shift.start_time))
-        shift_end = make_aware(datetime.combine(date, shift.end_time))
+        current_start = make_aware(datetime.combine(date, shift_start))
+        shift_end = make_aware(datetime.combine(date, shift_end))
 
         while current_start + duration <= shift_end:
             if current_start < now_dt:
@@ -68,4 +336,4 @@ def get_available_slots(*, salon, specialist, procedure, date):
             current_start += step
 
     available_times.sort()
-    return available_times
\ No newline at end of file
+    return available_times
@@ -0,0 +1,49 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from core.thumbnails import RESPONSIVE_WIDTHS, make_variants, thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(field_file, size="avatar"):
+    """
+    URL уменьшенной копии фото: {{ specialist.photo|thumbnail:"avatar" }}.
+    size — имя из core.thumbnails.THUMBNAIL_SIZES или "ширинаxвысота".
+    """
+    return thumbnail_url(field_file, size)
+
+
+@register.simple_tag
+def responsive_image(field_file, alt="", sizes="100vw", css_class="", widths=None, loading="lazy"):
+    """
+    <picture> с вариантами WebP и JPEG разной ширины:
+        {% responsive_image salon.image alt=salon.name sizes="(max-width: 767px) 100vw, 25vw" css_class="salons__block_img" %}
+    widths — ширины через пробел, по умолчанию RESPONSIVE_WIDTHS. Для SVG
+    и нечитаемых файлов — обычный <img> с оригиналом.
+    """
+    if not field_file:
+        return ""
+    widths = [int(width) for width in widths.split()] if widths else RESPONSIVE_WIDTHS
+    variants = make_variants(field_file, widths)
+    if not variants:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            field_file.url, alt, css_class, loading,
+        )
+
+    url = field_file.storage.url
+
+    def srcset(index):
+        return format_html_join(", ", "{} {}w", ((url(variant[index]), variant[0]) for variant in variants))
+
+    # запасной src — вариант около 640px, если он есть
+    fallback = min(variants, key=lambda variant: abs(variant[0] - 640))
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        srcset(1), sizes, url(fallback[2]), srcset(2), sizes, alt, css_class, loading,
+    )
@@ -0,0 +1,1830 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time as time_module
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import urlencode
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.cache import caches
+from django.db import OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .availability import bitmap_slot_times, build_day_bits, find_inconsistent_days, get_available_slots_from_bitmap
+from .booking_expiry import expire_unpaid_bookings
+from .booking_status import cancel_bookings, mark_bookings_paid
+from .models import (
+    Salon, Procedure, Specialist, SpecialistSalon, SpecialistDayAvailability,
+    WorkShift, ShiftTemplate, Booking, SiteSettings, ProcedureOffering, PromoCode, PromoCodeUsage,
+    PaymentNotification,
+)
+from . import payments, slot_cache, thumbnails as thumbnails_module
+from .context_processors import site_settings
+from .payment_inbox import UNMATCHED_PAYMENT_PROBLEM, process_all_notifications
+from .paginators import CappedCountPaginator
+from .payment_reconcile import reconcile_payments
+from .pricing import get_price_matrix
+from .promo_codes import PromoUnavailable, clear_promo_index, find_promo, redeem_promo
+from .reservations import SlotUnavailable, hold_slot
+from .schedule_snapshot import SalonDaySnapshot, get_any_master_availability, get_salon_availability_vectorized
+from .shift_templates import generate_shifts
+from .site_settings import clear_site_settings_cache, get_site_settings
+from .templatetags.thumbnails import responsive_image
+from .thumbnails import THUMBNAIL_SIZES, make_variants, source_version, thumbnail_name, thumbnail_url, variant_name
+from .slots import (
+    count_month_slots, find_next_slots, get_available_slots, get_salon_availability, merge_shifts,
+    scan_slot_times, scan_slot_times_naive,
+)
+
+
+def random_day_schedule(rng, day, *, shifts=3, bookings=20):
+    """Случайные смены и записи на день — для сравнения движков слотов."""
+    shift_rows = []
+    for _ in range(shifts):
+        start = rng.randrange(7 * 60, 20 * 60, 5)
+        end = start + rng.randrange(-30, 8 * 60, 5)
+        end = max(0, min(end, 23 * 60 + 55))
+        shift_rows.append((time(start // 60, start % 60), time(end // 60, end % 60)))
+    shift_rows.sort()
+
+    day_start = timezone.make_aware(datetime.combine(day, time.min))
+    booked = []
+    for _ in range(bookings):
+        start = day_start + timedelta(minutes=rng.randrange(6 * 60, 22 * 60))
+        booked.append((start, start + timedelta(minutes=rng.choice([0, 10, 15, 30, 45, 60, 90, 120]))))
+    return shift_rows, booked
+
+
+class Schedule(NamedTuple):
+    """Салон, процедура, мастер и день из make_schedule."""
+    salon: Salon
+    procedure: Procedure
+    specialist: Specialist
+    day: date
+
+    def start_at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+
+    def new_booking(self, hour=10, minute=0, **fields):
+        """Несохранённая запись на hour:minute; end_at посчитает hold_slot."""
+        return Booking(**{
+            "salon": self.salon, "procedure": self.procedure, "specialist": self.specialist,
+            "phone": "+79990001122", "price_original": 1000, "price_final": 1000,
+            "start_at": self.start_at(hour, minute),
+            **fields,
+        })
+
+    def book(self, hour, minute=0, *, minutes=60, **fields):
+        """Сохранённая запись на minutes минут — без проверки, что время свободно."""
+        booking = self.new_booking(hour, minute, **fields)
+        booking.end_at = booking.start_at + timedelta(minutes=minutes)
+        booking.save()
+        return booking
+
+
+def make_schedule(shift=(time(10), time(12)), *, days_ahead=1, title="Маникюр", duration_minutes=60,
+                  base_price=1000, linked=False):
+    """
+    Салон, процедура и мастер со сменой shift через days_ahead дней —
+    общая заготовка тестов записи. shift=None — без смены; linked — мастер
+    работает в салоне и делает процедуру (режим «любой мастер»).
+    """
+    salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1")
+    procedure = Procedure.objects.create(title=title, duration_minutes=duration_minutes, base_price=base_price)
+    specialist = Specialist.objects.create(full_name="Мастер")
+    day = timezone.localdate() + timedelta(days=days_ahead)
+    if linked:
+        specialist.procedures.add(procedure)
+        SpecialistSalon.objects.create(specialist=specialist, salon=salon)
+    if shift:
+        start_time, end_time = shift
+        WorkShift.objects.create(salon=salon, specialist=specialist, date=day, start_time=start_time, end_time=end_time)
+    return Schedule(salon, procedure, specialist, day)
+
+
+class QueryBudgetMixin:
+    """
+    Бюджет запросов для view: assertQueryBudget падает, если выполнено
+    больше budget запросов, и печатает их SQL. assertViewWithinBudget
+    проверяет страницу до и после роста данных (grow) — так видно N+1.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(query["sql"] for query in context.captured_queries)
+            self.fail(f"{executed} запросов при бюджете {budget}:\n{queries}")
+
+    def assertViewWithinBudget(self, budget, url, params=None, *, grow=None, method="get", data=None):
+        for _ in range(2 if grow else 1):
+            caches["default"].clear()
+            clear_site_settings_cache()
+            query = f"?{urlencode(params)}" if params else ""
+            with self.assertQueryBudget(budget):
+                response = getattr(self.client, method)(url + query, data)
+            self.assertLess(response.status_code, 400)
+            if grow:
+                grow()
+        return response
+
+
+class SlotEngineDifferentialTests(SimpleTestCase):
+    def test_sweep_matches_naive_loop_on_generated_schedules(self):
+        rng = random.Random(20260122)
+        day = date(2026, 3, 14)
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+
+        for _ in range(500):
+            shifts, booked = random_day_schedule(
+                rng, day, shifts=rng.randint(0, 4), bookings=rng.randint(0, 40),
+            )
+            kwargs = dict(
+                date=day,
+                booked_intervals=booked,
+                duration=timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 150])),
+                now_dt=day_start + timedelta(minutes=rng.randrange(0, 24 * 60)),
+            )
+            self.assertEqual(
+                scan_slot_times(shifts=shifts, **kwargs),
+                scan_slot_times_naive(shifts=merge_shifts(shifts), **kwargs),
+            )
+
+    def test_benchmark_engines_agree(self):
+        out, err = StringIO(), StringIO()
+        call_command("bench_slots", "--bookings", "10", "50", "--days", "20", stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), "")
+        self.assertEqual(out.getvalue().count("naive="), 2)
+
+    def test_merge_shifts(self):
+        self.assertEqual(
+            merge_shifts([(time(14), time(18)), (time(10), time(12)), (time(11), time(14)), (time(19), time(19))]),
+            [(time(10), time(18))],
+        )
+
+
+class GetAvailableSlotsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule(shift=None)
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def slots(self, **kwargs):
+        params = dict(salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day)
+        params.update(kwargs)
+        return get_available_slots(**params)
+
+    def test_bookings_block_overlapping_slots(self):
+        WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(10), end_time=time(13),
+        )
+        self.schedule.book(11)
+        self.schedule.book(12, minutes=30, status=Booking.Status.CANCELED)
+
+        self.assertEqual(self.slots(), [time(10), time(12)])
+
+    def test_overlapping_shifts_do_not_duplicate_slots(self):
+        for start, end in ((time(10), time(12)), (time(11), time(13)), (time(13), time(14))):
+            WorkShift.objects.create(
+                salon=self.salon, specialist=self.specialist, date=self.day,
+                start_time=start, end_time=end,
+            )
+        self.assertEqual(self.slots(), [
+            time(10), time(10, 30), time(11), time(11, 30), time(12), time(12, 30), time(13),
+        ])
+
+    def test_overlapping_shifts_lookup(self):
+        morning = WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(10), end_time=time(12),
+        )
+        evening = WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(12), end_time=time(16),
+        )
+        overlap = WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(11), end_time=time(13),
+        )
+        self.assertEqual(list(morning.overlapping_shifts()), [overlap])
+        self.assertCountEqual(overlap.overlapping_shifts(), [morning, evening])
+
+    def test_no_shift_no_slots(self):
+        self.assertEqual(self.slots(), [])
+
+
+class SalonAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # мастеров добавляет add_specialist; мастер заготовки в салоне не работает
+        cls.schedule = make_schedule(shift=None, title="Стрижка")
+        cls.salon, cls.procedure, _, cls.day = cls.schedule
+
+    def add_specialist(self, name, shift_start, shift_end, bookings=()):
+        specialist = Specialist.objects.create(full_name=name)
+        specialist.procedures.add(self.procedure)
+        SpecialistSalon.objects.create(specialist=specialist, salon=self.salon)
+        WorkShift.objects.create(
+            salon=self.salon, specialist=specialist, date=self.day,
+            start_time=shift_start, end_time=shift_end,
+        )
+        for hour in bookings:
+            self.schedule.book(hour, specialist=specialist)
+        return specialist
+
+    def test_slots_list_free_specialists(self):
+        anna = self.add_specialist("Анна", time(10), time(12), bookings=[10])
+        olga = self.add_specialist("Ольга", time(10), time(12))
+
+        availability = get_salon_availability(salon=self.salon, procedure=self.procedure, date=self.day)
+
+        self.assertEqual(availability, [
+            (time(10), [olga]),
+            (time(10, 30), [olga]),
+            (time(11), [anna, olga]),
+        ])
+
+    def test_query_count_does_not_grow_with_specialists(self):
+        for index in range(6):
+            self.add_specialist(f"Мастер {index}", time(9), time(18), bookings=[12])
+
+        with self.assertNumQueries(3):
+            availability = get_salon_availability(salon=self.salon, procedure=self.procedure, date=self.day)
+
+        self.assertEqual(len(availability[0][1]), 6)
+
+        with self.assertNumQueries(3):
+            vectorized = get_salon_availability_vectorized(salon=self.salon, procedure=self.procedure, date=self.day)
+        self.assertEqual(vectorized, availability)
+
+    def test_snapshot_is_used_only_for_large_salons(self):
+        specialists = [
+            self.add_specialist(f"Мастер {index}", time(9), time(12), bookings=[9 + index]) for index in range(3)
+        ]
+        kwargs = dict(salon=self.salon, procedure=self.procedure, date=self.day, specialists=specialists)
+
+        expected = get_salon_availability(**kwargs)
+        self.assertEqual(get_any_master_availability(**kwargs), expected)
+        self.assertEqual(get_any_master_availability(**kwargs, min_specialists=3), expected)
+        self.assertEqual(get_any_master_availability(**{**kwargs, "specialists": []}, min_specialists=0), [])
+
+    def test_service_page_shows_any_master_slots(self):
+        olga = self.add_specialist("Ольга", time(10), time(11))
+
+        response = self.client.get("/service/", {
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "date": self.day.isoformat(),
+        })
+
+        self.assertEqual(response.context["any_master_slots"], [(time(10), [olga])])
+        self.assertContains(response, f'data-specialist-id="{olga.pk}"')
+
+
+class SalonSnapshotDifferentialTests(SimpleTestCase):
+    def test_snapshot_matches_per_specialist_scan(self):
+        rng = random.Random(20260311)
+        day = date(2026, 3, 14)
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+
+        for _ in range(100):
+            specialists = [Specialist(pk=pk, full_name=f"Мастер {pk}") for pk in range(1, rng.randint(1, 12))]
+            shifts_by_day, bookings_by_day = {}, {}
+            for specialist in specialists:
+                shifts, booked = random_day_schedule(
+                    rng, day, shifts=rng.randint(0, 3), bookings=rng.randint(0, 20),
+                )
+                shifts_by_day[(specialist.pk, day)] = shifts
+                bookings_by_day[(specialist.pk, day)] = [(start, end) for start, end in booked if start < end]
+
+            duration = rng.choice([15, 30, 45, 60, 90, 150])
+            now_dt = day_start + timedelta(minutes=rng.randrange(0, 24 * 60), seconds=rng.randrange(60))
+
+            expected = {}
+            for specialist in specialists:
+                key = (specialist.pk, day)
+                for slot_time in scan_slot_times(
+                    date=day, shifts=shifts_by_day[key], booked_intervals=bookings_by_day[key],
+                    duration=timedelta(minutes=duration), now_dt=now_dt,
+                ):
+                    expected.setdefault(slot_time, []).append(specialist)
+
+            snapshot = SalonDaySnapshot.from_schedule(
+                date=day, specialists=specialists,
+                shifts_by_day=shifts_by_day, bookings_by_day=bookings_by_day,
+            )
+            self.assertEqual(
+                snapshot.availability(duration, now_dt=now_dt),
+                sorted(expected.items()),
+            )
+
+
+class AvailabilityBitmapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule(shift=None, days_ahead=2, duration_minutes=45)
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def bitmap_slots(self):
+        return get_available_slots_from_bitmap(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        )
+
+    def fresh_slots(self):
+        return get_available_slots(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        )
+
+    def test_signals_keep_bitmap_in_sync(self):
+        WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(10), end_time=time(14),
+        )
+        booking = self.schedule.book(11, 15)
+        self.schedule.book(12, 30, minutes=20)
+        self.assertEqual(self.bitmap_slots(), self.fresh_slots())
+
+        booking.status = Booking.Status.CANCELED
+        booking.save()
+        self.assertEqual(self.bitmap_slots(), self.fresh_slots())
+        self.assertIn(time(11), self.bitmap_slots())
+
+        booking.delete()
+        self.assertEqual(find_inconsistent_days(date_from=self.day, date_to=self.day), [])
+
+    def test_check_command_reports_stale_rows(self):
+        WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.day,
+            start_time=time(10), end_time=time(12),
+        )
+        SpecialistDayAvailability.objects.update(free_bits=bytes(36))
+        day = self.day.isoformat()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_availability", "--from", day, "--to", day, "--check", stdout=StringIO())
+
+        call_command("rebuild_availability", "--from", day, "--to", day, stdout=StringIO())
+        self.assertEqual(find_inconsistent_days(date_from=self.day, date_to=self.day), [])
+
+
+class BitmapScanDifferentialTests(SimpleTestCase):
+    def test_bitmap_scan_matches_sweep_on_aligned_schedules(self):
+        rng = random.Random(5)
+        day = date(2026, 3, 14)
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+
+        for _ in range(300):
+            shifts, cursor = [], rng.randrange(6 * 60, 10 * 60, 5)
+            for _ in range(rng.randint(1, 3)):
+                end = min(cursor + rng.randrange(30, 5 * 60, 5), 23 * 60 + 55)
+                shifts.append((time(cursor // 60, cursor % 60), time(end // 60, end % 60)))
+                cursor = end + rng.randrange(5, 90, 5)
+                if cursor >= 23 * 60:
+                    break
+            booked = []
+            for _ in range(rng.randint(0, 12)):
+                start = day_start + timedelta(minutes=rng.randrange(6 * 60, 23 * 60, 5))
+                booked.append((start, start + timedelta(minutes=rng.randrange(5, 120, 5))))
+            duration = rng.randrange(5, 180, 5)
+            now_dt = day_start + timedelta(minutes=rng.randrange(0, 24 * 60))
+
+            shift_bits, free_bits = build_day_bits(date=day, shifts=shifts, booked_intervals=booked)
+            self.assertEqual(
+                bitmap_slot_times(
+                    date=day, shift_bits=shift_bits, free_bits=free_bits,
+                    duration_minutes=duration, now_dt=now_dt,
+                ),
+                scan_slot_times(
+                    date=day, shifts=shifts, booked_intervals=booked,
+                    duration=timedelta(minutes=duration), now_dt=now_dt,
+                ),
+            )
+
+
+class NextSlotsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule(shift=None, title="Стрижка", linked=True)
+        cls.salon, cls.procedure, cls.specialist, cls.start = cls.schedule
+
+    def add_day(self, offset, booked=True):
+        day = self.start + timedelta(days=offset)
+        WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=day,
+            start_time=time(10), end_time=time(12),
+        )
+        if booked:
+            self.schedule._replace(day=day).book(10, minutes=120)
+        return day
+
+    def test_finds_first_free_day_within_query_budget(self):
+        for offset in range(40):
+            self.add_day(offset)
+        free_day = self.add_day(45, booked=False)
+
+        # окна 7 + 14 + 28 дней: по два запроса на окно
+        with self.assertNumQueries(6):
+            found = find_next_slots(
+                salon=self.salon, procedure=self.procedure, specialist=self.specialist,
+                start_date=self.start, limit=2,
+            )
+
+        self.assertEqual(found, [
+            (free_day, time(10), self.specialist),
+            (free_day, time(10, 30), self.specialist),
+        ])
+
+    def test_any_master_and_empty_horizon(self):
+        self.add_day(0)
+        self.assertEqual(find_next_slots(
+            salon=self.salon, procedure=self.procedure, start_date=self.start, days=5,
+        ), [])
+
+        free_day = self.add_day(3, booked=False)
+        response = self.client.get("/api/next-slots/", {"salon": self.salon.pk, "procedure": self.procedure.pk})
+        self.assertEqual(response.json()["slots"][0], {
+            "date": free_day.isoformat(), "time": "10:00",
+            "specialist_id": self.specialist.pk, "specialist": "Мастер",
+        })
+
+
+    def test_month_counts_for_calendar(self):
+        next_month = (self.start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        offset = (next_month - self.start).days
+        busy_day = self.add_day(offset)
+        free_day = self.add_day(offset + 1, booked=False)
+
+        # мастера, смены и записи за месяц — по одному запросу
+        with self.assertNumQueries(3):
+            counts = count_month_slots(
+                salon=self.salon, procedure=self.procedure,
+                year=next_month.year, month=next_month.month,
+            )
+        self.assertEqual(counts[free_day], 3)
+        self.assertEqual(counts[busy_day], 0)
+        self.assertEqual(sum(counts.values()), 3)
+
+        response = self.client.get("/api/month-availability/", {
+            "salon": self.salon.pk, "procedure": self.procedure.pk,
+            "specialist": self.specialist.pk, "month": f"{next_month:%Y-%m}",
+        })
+        data = response.json()
+        self.assertEqual(data["month"], f"{next_month:%Y-%m}")
+        self.assertEqual(data["days"][free_day.isoformat()], 3)
+        self.assertEqual(data["days"][busy_day.isoformat()], 0)
+
+        response = self.client.get("/api/month-availability/", {
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "month": "2026-13",
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class SlotCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule()
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def setUp(self):
+        caches["default"].clear()
+        slot_cache.reset_cache_stats()
+
+    def cached_slots(self):
+        return slot_cache.get_cached_slots(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        )
+
+    def test_hit_after_miss_and_version_bump_on_booking(self):
+        self.assertEqual(self.cached_slots(), [time(10), time(10, 30), time(11)])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cached_slots(), [time(10), time(10, 30), time(11)])
+        self.assertEqual(slot_cache.get_cache_stats(), {"hits": 1, "misses": 1, "coalesced": 0})
+
+        self.schedule.book(10)
+        self.assertEqual(self.cached_slots(), [time(11)])
+        self.assertEqual(slot_cache.get_cache_stats()["misses"], 2)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {"default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }}
+            with override_settings(CACHES=file_cache):
+                self.cached_slots()
+                self.cached_slots()
+        self.assertEqual(slot_cache.get_cache_stats(), {"hits": 1, "misses": 1, "coalesced": 0})
+
+
+class SlotsApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule((time(10), time(11, 30)))
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def get(self, **headers):
+        return self.client.get("/api/slots/", {
+            "salon": self.salon.pk, "procedure": self.procedure.pk,
+            "specialist": self.specialist.pk, "date": self.day.isoformat(),
+        }, headers=headers)
+
+    def test_returns_slots_with_etag(self):
+        response = self.get()
+        self.assertEqual(response.json(), {"date": self.day.isoformat(), "slots": ["10:00", "10:30"]})
+        self.assertTrue(response.has_header("ETag"))
+
+    def test_repeat_poll_is_not_modified_until_booking(self):
+        etag = self.get()["ETag"]
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+        self.schedule.book(10)
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["slots"], [])
+
+    def test_missing_params(self):
+        self.assertEqual(self.client.get("/api/slots/", {"salon": self.salon.pk}).status_code, 400)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_misses_compute_once(self):
+        slot_cache.reset_cache_stats()
+        cache = caches["default"]
+        cache.clear()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time_module.sleep(0.2)
+            return [time(10)]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(slot_cache._single_flight(cache, "sf-test", compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[time(10)]] * 8)
+        self.assertEqual(slot_cache.get_cache_stats()["coalesced"], 7)
+
+
+class HoldSlotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule()
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def test_second_hold_for_same_time_fails(self):
+        booking = hold_slot(self.schedule.new_booking())
+        self.assertIsNotNone(booking.hold_expires_at)
+        with self.assertRaises(SlotUnavailable):
+            hold_slot(self.schedule.new_booking())
+
+    def test_expired_hold_frees_slot(self):
+        booking = hold_slot(self.schedule.new_booking(), hold_minutes=-1)
+        self.assertTrue(booking.hold_expired)
+        self.assertIn(time(10), get_available_slots(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        ))
+        hold_slot(self.schedule.new_booking())
+
+    def test_started_payment_keeps_expired_hold(self):
+        booking = hold_slot(self.schedule.new_booking(), hold_minutes=-1)
+        booking.payment_id = "2d9f-test"
+        booking.save()
+        with self.assertRaises(SlotUnavailable):
+            hold_slot(self.schedule.new_booking())
+
+    def test_time_outside_shift_is_rejected(self):
+        with self.assertRaises(SlotUnavailable):
+            hold_slot(self.schedule.new_booking(hour=15))
+
+    def test_specialist_is_not_held_in_two_salons_at_once(self):
+        other_salon = Salon.objects.create(name="Второй салон", address="ул. Тестовая, 2")
+        WorkShift.objects.create(
+            salon=other_salon, specialist=self.specialist, date=self.day,
+            start_time=time(10), end_time=time(12),
+        )
+        hold_slot(self.schedule.new_booking())
+
+        elsewhere = self.schedule.new_booking()
+        elsewhere.salon = other_salon
+        with self.assertRaises(SlotUnavailable):
+            hold_slot(elsewhere)
+        self.assertEqual(Booking.objects.filter(specialist=self.specialist).count(), 1)
+
+
+class HoldSlotConcurrencyTests(TransactionTestCase):
+    def test_parallel_requests_for_one_slot_have_exactly_one_winner(self):
+        schedule = make_schedule()
+        start_at = schedule.start_at(10)
+
+        barrier = threading.Barrier(16)
+        outcomes = []
+
+        def attempt():
+            try:
+                barrier.wait()
+                hold_slot(schedule.new_booking())
+                outcomes.append("won")
+            except SlotUnavailable:
+                outcomes.append("lost")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("won"), 1)
+        self.assertEqual(outcomes.count("lost"), 15)
+        self.assertEqual(Booking.objects.filter(start_at=start_at).count(), 1)
+
+
+class GenerateShiftsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.salon, _, cls.specialist, _ = make_schedule(shift=None)
+        for weekday in (ShiftTemplate.Weekday.MONDAY, ShiftTemplate.Weekday.WEDNESDAY):
+            ShiftTemplate.objects.create(
+                salon=cls.salon, specialist=cls.specialist, weekday=weekday,
+                start_time=time(10), end_time=time(18),
+            )
+        cls.monday = date(2026, 3, 2)
+
+    def test_expands_templates_and_skips_existing_shifts(self):
+        WorkShift.objects.create(
+            salon=self.salon, specialist=self.specialist, date=self.monday,
+            start_time=time(10), end_time=time(18),
+        )
+
+        created = generate_shifts(date_from=self.monday, date_to=self.monday + timedelta(days=13))
+
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            list(WorkShift.objects.order_by("date").values_list("date", flat=True)),
+            [self.monday + timedelta(days=offset) for offset in (0, 2, 7, 9)],
+        )
+        self.assertEqual(SpecialistDayAvailability.objects.filter(specialist=self.specialist).count(), 4)
+
+    def test_command_is_idempotent(self):
+        args = ("generate_shifts", "--from", self.monday.isoformat(), "--weeks", "2")
+        call_command(*args, stdout=StringIO())
+        call_command(*args, stdout=StringIO())
+        self.assertEqual(WorkShift.objects.count(), 4)
+
+
+class SiteSettingsCacheTests(TestCase):
+    def setUp(self):
+        clear_site_settings_cache()
+        self.addCleanup(clear_site_settings_cache)
+
+    def test_lazy_and_warm_cache_make_no_queries(self):
+        SiteSettings.objects.create(manager_phone="+79990001122")
+
+        with self.assertNumQueries(0):
+            context = site_settings(None)
+        with self.assertNumQueries(1):
+            self.assertEqual(context["settings"].manager_phone, "+79990001122")
+        with self.assertNumQueries(0):
+            self.assertEqual(site_settings(None)["settings"].manager_phone, "+79990001122")
+
+    def test_save_and_delete_reset_cache(self):
+        self.assertIsNone(get_site_settings())
+        record = SiteSettings.objects.create(manager_phone="+79990001122")
+        self.assertEqual(get_site_settings().manager_phone, "+79990001122")
+
+        record.manager_phone = "+79993334455"
+        record.save()
+        self.assertEqual(get_site_settings().manager_phone, "+79993334455")
+
+        record.delete()
+        self.assertIsNone(get_site_settings())
+        self.assertFalse(site_settings(None)["settings"])
+
+
+class PublicPagesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # бюджеты с холодными кэшами: слоты, цены и SiteSettings читаются из базы
+    INDEX_BUDGET = 4
+    SERVICE_BUDGET = 8
+    SERVICE_FINALLY_BUDGET = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salon, cls.procedure, cls.specialist, cls.day = make_schedule(
+            (time(9), time(21)), title="Стрижка", linked=True,
+        )
+
+    def grow(self):
+        """Ещё салоны, процедуры, мастера, смены и записи."""
+        for index in range(5):
+            salon = Salon.objects.create(name=f"Салон {index}", address="ул. Новая")
+            procedure = Procedure.objects.create(title=f"Услуга {index}", base_price=500)
+            specialist = Specialist.objects.create(full_name=f"Мастер {index}")
+            specialist.procedures.add(procedure, self.procedure)
+            SpecialistSalon.objects.create(specialist=specialist, salon=self.salon)
+            SpecialistSalon.objects.create(specialist=specialist, salon=salon)
+            WorkShift.objects.create(
+                salon=self.salon, specialist=specialist, date=self.day,
+                start_time=time(9), end_time=time(21),
+            )
+            start = timezone.make_aware(datetime.combine(self.day, time(10 + index)))
+            Booking.objects.create(
+                salon=self.salon, procedure=self.procedure, specialist=self.specialist,
+                phone="+79990001122", start_at=start, end_at=start + timedelta(hours=1),
+                price_original=1000, price_final=1000,
+            )
+
+    def test_index(self):
+        self.assertViewWithinBudget(self.INDEX_BUDGET, "/", grow=self.grow)
+
+    def test_service_selectors_and_slots(self):
+        for params in (
+            {},
+            {"salon": self.salon.pk},
+            {"salon": self.salon.pk, "procedure": self.procedure.pk, "date": self.day.isoformat()},
+            {
+                "salon": self.salon.pk, "procedure": self.procedure.pk,
+                "specialist": self.specialist.pk, "date": self.day.isoformat(),
+            },
+        ):
+            with self.subTest(params=params):
+                self.assertViewWithinBudget(self.SERVICE_BUDGET, "/service/", params)
+        self.assertViewWithinBudget(self.SERVICE_BUDGET, "/service/", {
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "date": self.day.isoformat(),
+        }, grow=self.grow)
+
+    def test_service_finally(self):
+        params = {
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "specialist": self.specialist.pk,
+            "date": self.day.isoformat(), "time": "18:00",
+        }
+        response = self.assertViewWithinBudget(self.SERVICE_FINALLY_BUDGET, "/service/finally/", params, grow=self.grow)
+        self.assertContains(response, "Мастер")
+
+    def test_unknown_selection_is_not_found(self):
+        self.assertEqual(self.client.get("/service/", {"salon": 999}).status_code, 404)
+        self.assertEqual(self.client.get("/service/", {"specialist": "x"}).status_code, 404)
+
+
+class IndexCatalogCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        clear_site_settings_cache()
+        self.salon = Salon.objects.create(name="Салон на Невском", address="Невский, 1")
+
+    def test_warm_page_makes_no_queries_and_revalidates(self):
+        response = self.client.get("/")
+        self.assertContains(response, "Салон на Невском")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get("/"), "Салон на Невском")
+        with self.assertNumQueries(0):
+            response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_bumps_version(self):
+        etag = self.client.get("/")["ETag"]
+
+        self.salon.name = "Салон на Литейном"
+        self.salon.save()
+
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Салон на Литейном")
+        self.assertNotContains(response, "Салон на Невском")
+
+
+class PricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1")
+        cls.other_salon = Salon.objects.create(name="Другой салон", address="ул. Новая, 2")
+        cls.procedures = [
+            Procedure.objects.create(title=f"Услуга {index}", duration_minutes=60, base_price=1000 + index)
+            for index in range(10)
+        ]
+        cls.procedure = cls.procedures[0]
+        ProcedureOffering.objects.create(salon=cls.salon, procedure=cls.procedure, price=1500)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_matrix_is_one_query_for_all_procedures(self):
+        with self.assertNumQueries(1):
+            prices = [get_price_matrix().price(self.salon.pk, procedure.pk) for procedure in self.procedures]
+        self.assertEqual(prices[0], 1500)
+        self.assertEqual(prices[1:], [procedure.base_price for procedure in self.procedures[1:]])
+        self.assertEqual(get_price_matrix().price(self.other_salon.pk, self.procedure.pk), 1000)
+
+        with self.assertNumQueries(0):
+            get_price_matrix()
+
+    def test_offering_change_invalidates_matrix(self):
+        self.assertEqual(get_price_matrix().price(self.salon.pk, self.procedure.pk), 1500)
+        ProcedureOffering.objects.filter(salon=self.salon).get().delete()
+        self.assertEqual(get_price_matrix().price(self.salon.pk, self.procedure.pk), 1000)
+
+        ProcedureOffering.objects.create(salon=self.other_salon, procedure=self.procedure, price=900)
+        self.assertEqual(get_price_matrix().price(self.other_salon.pk, self.procedure.pk), 900)
+
+    def test_promo_and_booking_use_salon_price(self):
+        PromoCode.objects.create(code="SPRING", discount_percent=10)
+        response = self.client.post("/api/validate-promo/", {
+            "promo_code": "spring", "procedure_id": self.procedure.pk, "salon_id": self.salon.pk,
+        }, content_type="application/json")
+        self.assertEqual(response.json()["original_price"], "1500.00")
+        self.assertEqual(response.json()["new_price"], "1350.00")
+
+        specialist = Specialist.objects.create(full_name="Мастер")
+        day = timezone.localdate() + timedelta(days=1)
+        WorkShift.objects.create(
+            salon=self.salon, specialist=specialist, date=day, start_time=time(10), end_time=time(12),
+        )
+        query = urlencode({
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "specialist": specialist.pk,
+            "date": day.isoformat(), "time": "10:00",
+        })
+        self.assertContains(self.client.get(f"/service/finally/?{query}"), "1500.00 ₽")
+        self.client.post(f"/service/finally/?{query}", {"customer_name": "Анна", "phone": "+79990001122"})
+        booking = Booking.objects.get()
+        self.assertEqual(booking.price_original, 1500)
+        self.assertEqual(booking.price_final, 1500)
+
+
+class PromoIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.salon, cls.procedure, cls.specialist, cls.day = make_schedule(title="Стрижка", base_price=2000)
+        cls.today = timezone.localdate()
+        PromoCode.objects.create(code="Kid20", discount_percent=20)
+        PromoCode.objects.create(code="later", discount_percent=5, valid_from=cls.today + timedelta(days=3))
+        PromoCode.objects.create(code="old", discount_percent=5, valid_to=cls.today - timedelta(days=1))
+        PromoCode.objects.create(code="off", discount_percent=5, is_active=False)
+
+    def setUp(self):
+        caches["default"].clear()
+        clear_promo_index()
+        self.addCleanup(clear_promo_index)
+
+    def validate(self, code):
+        return self.client.post("/api/validate-promo/", {
+            "promo_code": code, "procedure_id": self.procedure.pk, "salon_id": self.salon.pk,
+        }, content_type="application/json").json()
+
+    def test_lookup_is_case_insensitive_and_checks_dates(self):
+        self.assertEqual(find_promo("KID20").discount_percent, 20)
+        for code, message in (
+            ("later", "Промокод ещё не активен"),
+            ("old", "Срок действия промокода истёк"),
+            ("off", "Промокод не найден или неактивен"),
+            ("nope", "Промокод не найден или неактивен"),
+        ):
+            with self.subTest(code=code), self.assertRaisesMessage(PromoUnavailable, message):
+                find_promo(code)
+
+    def test_warm_validation_makes_no_queries(self):
+        self.assertEqual(self.validate("kid20")["new_price"], "1600.00")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate("KID20")["new_price"], "1600.00")
+
+    def test_save_and_delete_reload_index(self):
+        self.assertFalse(self.validate("summer")["valid"])
+        promo = PromoCode.objects.create(code="Summer", discount_percent=10)
+        self.assertEqual(self.validate("summer")["new_price"], "1800.00")
+
+        promo.is_active = False
+        promo.save()
+        self.assertFalse(self.validate("summer")["valid"])
+        promo.delete()
+        self.assertFalse(self.validate("summer")["valid"])
+
+    def test_booking_discount_is_applied_on_server(self):
+        query = urlencode({
+            "salon": self.salon.pk, "procedure": self.procedure.pk, "specialist": self.specialist.pk,
+            "date": self.day.isoformat(), "time": "10:00",
+        })
+        self.client.post(f"/service/finally/?{query}", {
+            "customer_name": "Анна", "phone": "+79990001122",
+            "promo_code_final": "KID20", "final_price": "1",
+        })
+
+        booking = Booking.objects.get()
+        self.assertEqual(booking.promo_code.code, "Kid20")
+        self.assertEqual(booking.price_original, 2000)
+        self.assertEqual(booking.price_final, 1600)
+
+
+class PromoLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule((time(10), time(13)))
+
+    def setUp(self):
+        clear_promo_index()
+        self.addCleanup(clear_promo_index)
+
+    def test_exhausted_promo_rejects_booking_and_leaves_index(self):
+        promo = PromoCode.objects.create(code="FIRST", discount_percent=10, max_redemptions=1)
+
+        def booking(hour):
+            return self.schedule.new_booking(
+                hour, promo_code=promo, phone=f"+7999000112{hour % 10}", price_final=900,
+            )
+
+        hold_slot(booking(10), hold_minutes=-1)
+        # повторное удержание той же записи после истечения брони не списывает ещё раз
+        hold_slot(Booking.objects.get())
+        with self.assertRaisesMessage(PromoUnavailable, "Промокод закончился"):
+            hold_slot(booking(11))
+
+        self.assertEqual(Booking.objects.count(), 1)
+        promo.refresh_from_db()
+        self.assertEqual(promo.redemptions_count, 1)
+        with self.assertRaises(PromoUnavailable):
+            find_promo("first")
+
+    def test_unavailable_promo_is_reported_on_form(self):
+        salon, procedure, specialist, day = self.schedule
+        PromoCode.objects.create(code="GONE", discount_percent=10, max_redemptions=1, redemptions_count=1)
+        query = urlencode({
+            "salon": salon.pk, "procedure": procedure.pk, "specialist": specialist.pk,
+            "date": day.isoformat(), "time": "10:00",
+        })
+
+        response = self.client.post(f"/service/finally/?{query}", {
+            "customer_name": "Анна", "phone": "+79990001122", "promo_code_final": "gone",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Промокод не найден или неактивен")
+        self.assertFalse(Booking.objects.exists())
+
+
+def retry_locked(execute, sql, params, many, context):
+    """
+    Общий кэш тестовой SQLite в памяти блокирует таблицы без ожидания
+    ("database table is locked"). Оператор, упавший на блокировке, ничего
+    не изменил — повторяем его, как сделал бы busy_timeout обычной базы.
+    """
+    deadline = time_module.monotonic() + 5
+    while True:
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if "locked" not in str(error) or time_module.monotonic() > deadline:
+                raise
+            time_module.sleep(0.001)
+
+
+class PromoLimitConcurrencyTests(TransactionTestCase):
+    def redeem_in_parallel(self, promo, phones):
+        """
+        redeem_promo из параллельных потоков в autocommit — без замка мастера
+        и транзакции записи, так что лимит держат только условные UPDATE.
+        """
+        barrier = threading.Barrier(len(phones))
+        outcomes = []
+
+        def attempt(phone):
+            try:
+                barrier.wait()
+                with connection.execute_wrapper(retry_locked):
+                    redeem_promo(promo.pk, phone)
+                outcomes.append("redeemed")
+            except PromoUnavailable:
+                outcomes.append("rejected")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(phone,)) for phone in phones]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        promo.refresh_from_db()
+        return outcomes
+
+    def test_total_cap_holds_exactly(self):
+        promo = PromoCode.objects.create(code="FIRST5", discount_percent=10, max_redemptions=5)
+        outcomes = self.redeem_in_parallel(promo, [f"+7999000{index:04d}" for index in range(16)])
+
+        self.assertEqual(outcomes.count("redeemed"), 5)
+        self.assertEqual(outcomes.count("rejected"), 11)
+        self.assertEqual(promo.redemptions_count, 5)
+        self.assertEqual(PromoCodeUsage.objects.filter(promo=promo).count(), 5)
+
+    def test_per_phone_limit_holds_exactly(self):
+        promo = PromoCode.objects.create(code="TWICE", discount_percent=10, per_phone_limit=2)
+        outcomes = self.redeem_in_parallel(promo, ["+79990001122"] * 12)
+
+        self.assertEqual(outcomes.count("redeemed"), 2)
+        self.assertEqual(PromoCodeUsage.objects.get().redemptions, 2)
+
+        # в транзакции записи отказ по телефону откатывает и общий счётчик
+        used = promo.redemptions_count
+        with self.assertRaises(PromoUnavailable), transaction.atomic():
+            redeem_promo(promo.pk, "+79990001122")
+        promo.refresh_from_db()
+        self.assertEqual(promo.redemptions_count, used)
+
+
+class StubYooKassa:
+    """
+    Заглушка API ЮKassa на локальном порту: POST /v3/payments и
+    GET /v3/payments/<id>. delay — задержка перед ответом, fail_statuses —
+    коды, которыми ответят следующие запросы, created_status — статус новых
+    платежей, max_in_flight — сколько запросов обрабатывалось одновременно.
+    Как и ЮKassa, повтор с тем же Idempotence-Key возвращает тот же платёж.
+    """
+
+    def __init__(self):
+        self.delay = 0
+        self.fail_statuses = []
+        self.created_status = "pending"
+        self.in_flight = self.max_in_flight = 0
+        self.requests = []
+        self.payments = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.handle_api(None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.handle_api(json.loads(self.rfile.read(length) or b"{}"))
+
+            def handle_api(self, body):
+                status, data = stub.respond(self, body)
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time_module.sleep(stub.delay)
+                with stub._lock:
+                    stub.in_flight -= 1
+                payload = json.dumps(data).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except OSError:
+                    pass  # клиент не дождался ответа
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v3"
+
+    def respond(self, handler, body):
+        with self._lock:
+            self.requests.append({
+                "method": handler.command,
+                "path": handler.path,
+                "headers": dict(handler.headers),
+                "body": body,
+                "port": handler.client_address[1],
+            })
+            if self.fail_statuses:
+                return self.fail_statuses.pop(0), {"type": "error", "description": "stub failure"}
+            if handler.command == "GET":
+                payment = self.payments.get(handler.path.rsplit("/", 1)[-1])
+                return (200, payment) if payment else (404, {"type": "error", "description": "not found"})
+            key = handler.headers.get("Idempotence-Key")
+            if key not in self._by_key:
+                payment_id = f"pay-{len(self.payments) + 1}"
+                self.payments[payment_id] = {
+                    "id": payment_id,
+                    "status": self.created_status,
+                    "amount": body["amount"],
+                    "metadata": body.get("metadata", {}),
+                    "confirmation": {
+                        "type": "redirect",
+                        "confirmation_url": f"https://yoomoney.test/checkout?orderId={payment_id}",
+                    },
+                }
+                self._by_key[key] = payment_id
+            return 200, self.payments[self._by_key[key]]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class YooKassaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = StubYooKassa().__enter__()
+        self.addCleanup(self.stub.__exit__)
+
+    def client_for_stub(self, **kwargs):
+        client = payments.YooKassaClient(api_url=self.stub.url, shop_id="shop", secret_key="secret", **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def payload(self):
+        return {"amount": {"value": "1000.00", "currency": "RUB"}, "metadata": {"booking_id": 1}}
+
+    def test_requests_reuse_one_connection(self):
+        client = self.client_for_stub()
+        first = client.create_payment(self.payload(), idempotence_key="k1")
+        second = client.create_payment(self.payload(), idempotence_key="k2")
+
+        self.assertEqual((first.id, second.id), ("pay-1", "pay-2"))
+        self.assertEqual(first.confirmation_url, "https://yoomoney.test/checkout?orderId=pay-1")
+        self.assertEqual(len({request["port"] for request in self.stub.requests}), 1)
+        self.assertTrue(self.stub.requests[0]["headers"]["Authorization"].startswith("Basic "))
+        self.assertEqual(self.stub.requests[0]["headers"]["Idempotence-Key"], "k1")
+
+    def test_server_errors_are_retried_with_same_key(self):
+        self.stub.fail_statuses = [503, 500]
+        payment = self.client_for_stub(max_retries=2).create_payment(self.payload(), idempotence_key="k1")
+
+        self.assertEqual(payment.id, "pay-1")
+        self.assertEqual([request["headers"]["Idempotence-Key"] for request in self.stub.requests], ["k1"] * 3)
+
+    def test_retries_are_bounded(self):
+        self.stub.fail_statuses = [503] * 5
+        with self.assertRaisesMessage(payments.PaymentError, "503"):
+            self.client_for_stub(max_retries=1).create_payment(self.payload(), idempotence_key="k1")
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_slow_provider_hits_read_timeout(self):
+        self.stub.delay = 1
+        client = self.client_for_stub(timeout=(1, 0.2), max_retries=0)
+        started = time_module.monotonic()
+        with self.assertRaisesMessage(payments.PaymentError, "недоступна"):
+            client.create_payment(self.payload(), idempotence_key="k1")
+        self.assertLess(time_module.monotonic() - started, 0.8)
+
+    @override_settings(YOOKASSA_SHOP_ID="shop", YOOKASSA_SECRET_KEY="secret")
+    def test_async_calls_do_not_block_each_other(self):
+        self.stub.delay = 0.3
+        with override_settings(YOOKASSA_API_URL=self.stub.url):
+            payments.close_client()
+            self.addCleanup(payments.close_client)
+
+            async def create_many():
+                return await asyncio.gather(*(
+                    payments.acreate_payment(self.payload(), f"k{index}") for index in range(5)
+                ))
+
+            started = time_module.monotonic()
+            created = asyncio.run(create_many())
+
+        self.assertEqual(len({payment.id for payment in created}), 5)
+        self.assertLess(time_module.monotonic() - started, 5 * 0.3)
+
+
+class CreatePaymentViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.booking = hold_slot(make_schedule().new_booking(customer_name="Анна"))
+
+    def setUp(self):
+        self.stub = StubYooKassa().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        overrides = override_settings(
+            YOOKASSA_API_URL=self.stub.url, YOOKASSA_SHOP_ID="shop", YOOKASSA_SECRET_KEY="secret",
+            YOOKASSA_TIMEOUT=(1, 0.3), YOOKASSA_MAX_RETRIES=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        payments.close_client()
+        self.addCleanup(payments.close_client)
+        caches["default"].clear()
+
+    def test_redirects_to_confirmation_url(self):
+        response = self.client.get(f"/create-payment/{self.booking.pk}/")
+
+        self.assertRedirects(
+            response, "https://yoomoney.test/checkout?orderId=pay-1", fetch_redirect_response=False,
+        )
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_id, "pay-1")
+        self.assertEqual(self.stub.requests[0]["body"]["amount"], {"value": "1000.00", "currency": "RUB"})
+
+    def test_slow_provider_does_not_hang_request(self):
+        self.stub.delay = 1
+        response = self.client.get(f"/create-payment/{self.booking.pk}/")
+
+        self.assertRedirects(response, "/?error=payment_unavailable", fetch_redirect_response=False)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_id, "")
+
+    def test_repeated_clicks_reuse_pending_payment(self):
+        url = f"/create-payment/{self.booking.pk}/"
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first["Location"], second["Location"])
+        self.assertEqual(len(self.stub.requests), 1)
+
+        # ссылка вытеснена из кэша — платёж проверяется, а не создаётся заново
+        caches["default"].clear()
+        third = self.client.get(url)
+        self.assertEqual(third["Location"], first["Location"])
+        self.assertEqual([request["method"] for request in self.stub.requests], ["POST", "GET"])
+
+    def test_canceled_payment_is_replaced(self):
+        url = f"/create-payment/{self.booking.pk}/"
+        self.client.get(url)
+        self.stub.payments["pay-1"]["status"] = "canceled"
+        caches["default"].clear()
+
+        response = self.client.get(url)
+
+        self.assertEqual(response["Location"], "https://yoomoney.test/checkout?orderId=pay-2")
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_id, "pay-2")
+        keys = [request["headers"].get("Idempotence-Key") for request in self.stub.requests if request["method"] == "POST"]
+        self.assertEqual(len(set(keys)), 2)
+
+    def test_retry_after_cancel_notification_creates_new_payment(self):
+        url = f"/create-payment/{self.booking.pk}/"
+        self.client.get(url)
+        self.stub.payments["pay-1"]["status"] = "canceled"
+        self.client.post(
+            "/yookassa-webhook/",
+            data=json.dumps({"event": "payment.canceled", "object": {"id": "pay-1", "status": "canceled"}}),
+            content_type="application/json",
+        )
+        process_all_notifications()
+
+        response = self.client.get(url)
+
+        # с прежним ключом ЮKassa вернула бы отменённый pay-1
+        self.assertEqual(response["Location"], "https://yoomoney.test/checkout?orderId=pay-2")
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.payment_id, self.booking.payment_attempt), ("pay-2", 1))
+        keys = [request["headers"].get("Idempotence-Key") for request in self.stub.requests if request["method"] == "POST"]
+        self.assertEqual(len(set(keys)), 2)
+
+    def test_canceled_payment_is_never_offered_for_checkout(self):
+        url = f"/create-payment/{self.booking.pk}/"
+        self.client.get(url)
+        # ответ на создание pay-1 не дошёл до записи, а ЮKassa платёж уже отменила
+        self.stub.payments["pay-1"]["status"] = "canceled"
+        Booking.objects.filter(pk=self.booking.pk).update(payment_id="")
+        caches["default"].clear()
+
+        response = self.client.get(url)
+
+        self.assertEqual(response["Location"], "https://yoomoney.test/checkout?orderId=pay-2")
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_id, "pay-2")
+
+        # ЮKassa сразу отменяет и новые платежи — на оплату не отправляем
+        self.stub.payments["pay-2"]["status"] = "canceled"
+        self.stub.created_status = "canceled"
+        caches["default"].clear()
+        response = self.client.get(url)
+        self.assertRedirects(response, "/?error=payment_unavailable", fetch_redirect_response=False)
+
+    def test_canceled_booking_cannot_be_paid(self):
+        Booking.objects.filter(pk=self.booking.pk).update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertEqual(expire_unpaid_bookings(), 1)
+
+        response = self.client.get(f"/create-payment/{self.booking.pk}/")
+
+        self.assertRedirects(response, "/?error=booking_canceled", fetch_redirect_response=False)
+        self.assertEqual(self.stub.requests, [])
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.status, self.booking.payment_id), (Booking.Status.CANCELED, ""))
+        # отмена между проверкой во view и созданием платежа — ссылка не отдаётся
+        with self.assertRaises(payments.PaymentError):
+            payments.get_booking_payment(Booking.objects.get(pk=self.booking.pk))
+
+    async def test_async_path_reuses_booking_payment(self):
+        first, second = await asyncio.gather(
+            payments.aget_booking_payment(await Booking.objects.aget(pk=self.booking.pk)),
+            payments.aget_booking_payment(await Booking.objects.aget(pk=self.booking.pk)),
+        )
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(
+            self.stub.requests[0]["headers"].get("Idempotence-Key"), payments.booking_idempotence_key(self.booking),
+        )
+        self.assertEqual((await Booking.objects.aget(pk=self.booking.pk)).payment_id, first.id)
+
+    def test_idempotence_key_is_derived_from_booking(self):
+        key = payments.booking_idempotence_key(self.booking)
+        self.assertEqual(key, payments.booking_idempotence_key(Booking.objects.get(pk=self.booking.pk)))
+        self.booking.payment_attempt += 1
+        self.assertNotEqual(key, payments.booking_idempotence_key(self.booking))
+
+
+class CreatePaymentBurstTests(TransactionTestCase):
+    def test_burst_of_requests_makes_one_provider_call(self):
+        booking = hold_slot(make_schedule().new_booking())
+        caches["default"].clear()
+
+        barrier = threading.Barrier(8)
+        urls = []
+
+        def attempt():
+            try:
+                barrier.wait()
+                urls.append(payments.get_booking_payment(Booking.objects.get(pk=booking.pk)).confirmation_url)
+            finally:
+                connection.close()
+
+        with StubYooKassa() as stub, override_settings(
+            YOOKASSA_API_URL=stub.url, YOOKASSA_SHOP_ID="shop", YOOKASSA_SECRET_KEY="secret",
+        ):
+            stub.delay = 0.2
+            payments.close_client()
+            self.addCleanup(payments.close_client)
+            threads = [threading.Thread(target=attempt) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(urls, ["https://yoomoney.test/checkout?orderId=pay-1"] * 8)
+        booking.refresh_from_db()
+        self.assertEqual(booking.payment_id, "pay-1")
+
+
+class PaymentWebhookTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule((time(10), time(14)))
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def paid_booking(self, hour, payment_id, **kwargs):
+        return self.schedule.book(hour, payment_id=payment_id, **kwargs)
+
+    def notify(self, payment_id, status):
+        return self.client.post(
+            "/yookassa-webhook/",
+            data=json.dumps({"type": "notification", "event": f"payment.{status}",
+                             "object": {"id": payment_id, "status": status}}),
+            content_type="application/json",
+        )
+
+    def test_webhook_only_enqueues_and_ignores_replays(self):
+        booking = self.paid_booking(10, "pay-1")
+        for _ in range(3):
+            with self.assertQueryBudget(1):
+                response = self.notify("pay-1", "succeeded")
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(PaymentNotification.objects.count(), 1)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.NEW)
+
+    def test_bad_payload_is_rejected(self):
+        response = self.client.post("/yookassa-webhook/", data="{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentNotification.objects.exists())
+
+    def test_worker_applies_batch_with_fixed_queries(self):
+        paid = [self.paid_booking(hour, f"pay-{hour}") for hour in (10, 11, 12)]
+        canceled = self.paid_booking(13, "pay-13", hold_expires_at=timezone.now() - timedelta(minutes=1))
+        for booking in paid:
+            self.notify(booking.payment_id, "succeeded")
+        self.notify("pay-13", "canceled")
+        self.notify("pay-unknown", "succeeded")
+
+        # пачка + пересчёт масок задетых дней, не зависит от числа уведомлений
+        with self.assertQueryBudget(13), self.assertLogs("core.payment_inbox", "ERROR"):
+            self.assertEqual(process_all_notifications(batch_size=100), 5)
+
+        for booking in paid:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, Booking.Status.CONFIRMED)
+            self.assertIsNotNone(booking.paid_at)
+        canceled.refresh_from_db()
+        self.assertEqual((canceled.status, canceled.payment_id), (Booking.Status.NEW, ""))
+        # отменённый платёж освободил время в масках доступности
+        self.assertIn(time(13), get_available_slots_from_bitmap(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        ))
+
+        self.assertEqual(
+            list(PaymentNotification.objects.exclude(problem="").values_list("payment_id", flat=True)),
+            ["pay-unknown"],
+        )
+
+        # повтор уже обработанного уведомления ничего не меняет
+        self.notify("pay-10", "succeeded")
+        with self.assertQueryBudget(3):
+            self.assertEqual(process_all_notifications(batch_size=100), 0)
+
+    def test_payment_for_canceled_booking_is_flagged(self):
+        canceled = self.paid_booking(10, "pay-1", status=Booking.Status.CANCELED)
+        confirmed = self.paid_booking(11, "pay-2", status=Booking.Status.CONFIRMED)
+        self.notify("pay-1", "succeeded")
+        self.notify("pay-2", "succeeded")
+
+        with self.assertLogs("core.payment_inbox", "ERROR") as logs:
+            process_all_notifications()
+
+        self.assertIn("pay-1", logs.output[0])
+        canceled.refresh_from_db()
+        self.assertEqual((canceled.status, canceled.paid_at), (Booking.Status.CANCELED, None))
+        # подтверждённая в админке запись просто отмечается оплаченной
+        confirmed.refresh_from_db()
+        self.assertIsNotNone(confirmed.paid_at)
+        notifications = dict(PaymentNotification.objects.values_list("payment_id", "problem"))
+        self.assertEqual(notifications["pay-1"], UNMATCHED_PAYMENT_PROBLEM)
+        self.assertEqual(notifications["pay-2"], "")
+        self.assertFalse(PaymentNotification.objects.filter(processed_at__isnull=True).exists())
+
+
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        self.stub = StubYooKassa().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        overrides = override_settings(
+            YOOKASSA_API_URL=self.stub.url, YOOKASSA_SHOP_ID="shop", YOOKASSA_SECRET_KEY="secret",
+            YOOKASSA_MAX_RETRIES=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        payments.close_client()
+        self.addCleanup(payments.close_client)
+
+    def test_stuck_bookings_are_reconciled_in_parallel_batches(self):
+        schedule = make_schedule((time(9), time(21)))
+
+        remote_statuses = ["succeeded", "canceled", "pending", None]
+        bookings = []
+        for index in range(20):
+            bookings.append(schedule.book(
+                9 + index % 12, payment_id=f"pay-{index}", hold_expires_at=timezone.now() - timedelta(minutes=1),
+            ))
+            status = remote_statuses[index % 4]
+            if status:
+                self.stub.payments[f"pay-{index}"] = {"id": f"pay-{index}", "status": status}
+        self.stub.delay = 0.05
+
+        stats = reconcile_payments(older_than=timedelta(0), workers=4, batch_size=7)
+
+        self.assertEqual(stats, {"succeeded": 5, "canceled": 5, "pending": 5, None: 5})
+        self.assertLessEqual(self.stub.max_in_flight, 4)
+        self.assertGreater(self.stub.max_in_flight, 1)
+        for index, booking in enumerate(bookings):
+            booking.refresh_from_db()
+            expected = {
+                "succeeded": (Booking.Status.CONFIRMED, f"pay-{index}"),
+                "canceled": (Booking.Status.NEW, ""),
+            }.get(remote_statuses[index % 4], (Booking.Status.NEW, f"pay-{index}"))
+            self.assertEqual((booking.status, booking.payment_id), expected)
+
+        # подтверждённые и отменённые больше не запрашиваются
+        self.stub.requests.clear()
+        stats = reconcile_payments(older_than=timedelta(0), workers=4)
+        self.assertEqual(sum(stats.values()), 10)
+        self.assertEqual(len(self.stub.requests), 10)
+
+    def test_command_reports_counts(self):
+        out = StringIO()
+        call_command("reconcile_payments", "--older-than", "0", stdout=out)
+        self.assertIn("Проверено: 0", out.getvalue())
+
+
+class ExpireUnpaidBookingsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = make_schedule((time(10), time(17)))
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def booking(self, hour, *, age_minutes=0, **kwargs):
+        booking = self.schedule.book(hour, **kwargs)
+        Booking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - timedelta(minutes=age_minutes))
+        return booking
+
+    def free_times(self):
+        return get_available_slots_from_bitmap(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        )
+
+    def test_only_unpaid_web_bookings_past_deadline_are_canceled(self):
+        expired_hold = timezone.now() - timedelta(minutes=1)
+        active_hold = timezone.now() + timedelta(minutes=10)
+        abandoned = self.booking(10, hold_expires_at=expired_hold)
+        unpaid = self.booking(11, age_minutes=90, hold_expires_at=active_hold)
+        paying = self.booking(12, age_minutes=5, hold_expires_at=expired_hold, payment_id="pay-2")
+        holding = self.booking(13, hold_expires_at=active_hold)
+        by_phone = self.booking(14, age_minutes=600, source=Booking.Source.PHONE)
+        paid = self.booking(
+            15, age_minutes=600, hold_expires_at=expired_hold, payment_id="pay-3",
+            status=Booking.Status.CONFIRMED, paid_at=timezone.now(),
+        )
+        # платёж ещё может пройти — отменит его ЮKassa, а не сроки на сайте
+        pending = self.booking(16, age_minutes=90, hold_expires_at=expired_hold, payment_id="pay-1")
+        self.assertNotIn(time(11), self.free_times())
+
+        self.assertEqual(expire_unpaid_bookings(deadline_minutes=60, batch_size=1), 2)
+
+        statuses = {
+            booking.pk: booking.status
+            for booking in Booking.objects.all()
+        }
+        self.assertEqual(statuses[abandoned.pk], Booking.Status.CANCELED)
+        self.assertEqual(statuses[unpaid.pk], Booking.Status.CANCELED)
+        for booking in (paying, holding, by_phone, pending):
+            self.assertEqual(statuses[booking.pk], Booking.Status.NEW)
+        self.assertEqual(statuses[paid.pk], Booking.Status.CONFIRMED)
+        # UPDATE без сигналов, но маски дня пересчитаны
+        self.assertIn(time(11), self.free_times())
+
+    def test_canceled_booking_returns_promo_redemption(self):
+        clear_promo_index()
+        self.addCleanup(clear_promo_index)
+        promo = PromoCode.objects.create(code="ONCE", discount_percent=10, max_redemptions=1, per_phone_limit=1)
+        hold_slot(self.schedule.new_booking(promo_code=promo, price_final=900), hold_minutes=-1)
+        with self.assertRaises(PromoUnavailable):
+            find_promo("once")
+
+        self.assertEqual(expire_unpaid_bookings(), 1)
+
+        promo.refresh_from_db()
+        self.assertEqual(promo.redemptions_count, 0)
+        self.assertEqual(PromoCodeUsage.objects.get().redemptions, 0)
+        self.assertEqual(find_promo("once").pk, promo.pk)
+
+
+class BookingAdminTests(QueryBudgetMixin, TestCase):
+    CHANGELIST = "/admin/core/booking/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        cls.schedule = make_schedule((time(10), time(16)))
+        cls.salon, cls.procedure, cls.specialist, cls.day = cls.schedule
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_bookings(self, count, **kwargs):
+        return [self.schedule.book(10 + index % 6, **kwargs) for index in range(count)]
+
+    def test_changelist_query_count_does_not_grow(self):
+        def grow():
+            for index in range(10):
+                self.add_bookings(
+                    2,
+                    salon=Salon.objects.create(name=f"Салон {index}", address="ул. Тестовая, 2"),
+                    procedure=Procedure.objects.create(title=f"Услуга {index}", duration_minutes=30, base_price=500),
+                    specialist=Specialist.objects.create(full_name=f"Мастер {index}"),
+                )
+
+        self.add_bookings(2)
+        self.assertViewWithinBudget(8, self.CHANGELIST, grow=grow)
+
+    def test_capped_count_paginator(self):
+        self.add_bookings(7)
+        paginator = CappedCountPaginator(Booking.objects.order_by("pk"), 2)
+        paginator.count_cap = 5
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 6)
+        self.assertEqual(CappedCountPaginator(Booking.objects.order_by("pk"), 2).count, 7)
+
+    def test_bulk_actions_are_single_updates(self):
+        clear_promo_index()
+        self.addCleanup(clear_promo_index)
+        promo = PromoCode.objects.create(code="ADMIN", discount_percent=10)
+        bookings = self.add_bookings(4, promo_code=promo, hold_expires_at=timezone.now() + timedelta(minutes=10))
+        PromoCode.objects.filter(pk=promo.pk).update(redemptions_count=4)
+        PromoCodeUsage.objects.create(promo=promo, phone="+79990001122", redemptions=4)
+
+        response = self.client.post(self.CHANGELIST, {
+            "action": "cancel",
+            "_selected_action": [booking.pk for booking in bookings[:2]],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Booking.objects.filter(status=Booking.Status.CANCELED).count(), 2)
+        promo.refresh_from_db()
+        self.assertEqual(promo.redemptions_count, 2)
+        self.assertEqual(PromoCodeUsage.objects.get().redemptions, 2)
+        self.assertIn(time(10), get_available_slots_from_bitmap(
+            salon=self.salon, specialist=self.specialist, procedure=self.procedure, date=self.day,
+        ))
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(mark_bookings_paid(Booking.objects.all()), 2)
+        updates = [query["sql"] for query in context.captured_queries if query["sql"].startswith("UPDATE \"core_booking\"")]
+        self.assertEqual(len(updates), 1)
+        paid = Booking.objects.exclude(status=Booking.Status.CANCELED)
+        self.assertTrue(all(booking.paid_at and booking.hold_expires_at is None for booking in paid))
+        self.assertEqual(cancel_bookings(Booking.objects.filter(status=Booking.Status.CANCELED)), 0)
+
+
+    def test_confirm_skips_expired_holds(self):
+        held, expired = self.add_bookings(2, hold_expires_at=timezone.now() + timedelta(minutes=10))
+        Booking.objects.filter(pk=expired.pk).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        # время истёкшей брони уже занял другой клиент
+        other = self.schedule.book(expired.start_at.hour, phone="+79990003344")
+
+        response = self.client.post(self.CHANGELIST, {
+            "action": "confirm",
+            "_selected_action": [held.pk, expired.pk],
+        }, follow=True)
+
+        statuses = dict(Booking.objects.values_list("pk", "status"))
+        self.assertEqual(
+            [statuses[held.pk], statuses[expired.pk], statuses[other.pk]],
+            [Booking.Status.CONFIRMED, Booking.Status.NEW, Booking.Status.NEW],
+        )
+        self.assertEqual(
+            [str(message) for message in response.context["messages"]],
+            ["Подтверждено записей: 1",
+             "Не подтверждено записей с истёкшей бронью: 1 — время могли занять, запишите клиента заново"],
+        )
+
+
+def uploaded_image(name="photo.jpg", size=(1200, 800), image_format="JPEG"):
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 120, 90)).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def thumbnail(self, field_file, size):
+        version = source_version(field_file.storage, field_file.name)
+        return thumbnail_name(field_file.name, size, version)
+
+    def variant(self, field_file, width, extension):
+        version = source_version(field_file.storage, field_file.name)
+        return variant_name(field_file.name, width, extension, version)
+
+    def thumbnail_size(self, field_file, size):
+        with Image.open(field_file.storage.path(self.thumbnail(field_file, size))) as image:
+            return image.size
+
+    def test_thumbnails_are_created_on_upload(self):
+        salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1", image=uploaded_image())
+
+        for size in THUMBNAIL_SIZES.values():
+            self.assertEqual(self.thumbnail_size(salon.image, size), size)
+        self.assertEqual(
+            thumbnail_url(salon.image, "avatar"),
+            f"/media/{self.thumbnail(salon.image, 'avatar')}",
+        )
+
+    def test_other_sizes_are_created_on_first_access(self):
+        specialist = Specialist.objects.create(full_name="Мастер", photo=uploaded_image("m.png", image_format="PNG"))
+        url = thumbnail_url(specialist.photo, "50x30")
+
+        self.assertTrue(url.startswith("/media/thumbs/50x30/specialists/"))
+        self.assertEqual(self.thumbnail_size(specialist.photo, (50, 30)), (50, 30))
+
+    def test_thumbnail_extension_matches_its_format(self):
+        specialist = Specialist.objects.create(full_name="Мастер", photo=uploaded_image("m.gif", image_format="GIF"))
+
+        name = self.thumbnail(specialist.photo, "avatar")
+
+        self.assertRegex(name, r"\.gif\.[0-9a-f]+\.jpg$")
+        with Image.open(specialist.photo.storage.path(name)) as image:
+            self.assertEqual(image.format, "JPEG")
+
+    def test_replaced_original_gets_new_copies(self):
+        salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1", image=uploaded_image(size=(800, 600)))
+        storage, name = salon.image.storage, salon.image.name
+        old_thumbnail, old_variants = thumbnail_url(salon.image, "avatar"), make_variants(salon.image)
+
+        storage.delete(name)
+        replacement = BytesIO()
+        Image.new("RGB", (400, 300), (10, 20, 200)).save(replacement, "JPEG")
+        self.assertEqual(storage.save(name, ContentFile(replacement.getvalue())), name)
+        modified = os.path.getmtime(storage.path(name)) + 5
+        os.utime(storage.path(name), (modified, modified))
+
+        self.assertNotEqual(thumbnail_url(salon.image, "avatar"), old_thumbnail)
+        with Image.open(storage.path(self.thumbnail(salon.image, "avatar"))) as image:
+            red, green, blue = image.convert("RGB").getpixel((60, 60))
+            self.assertGreater(blue, red)
+        self.assertNotEqual(make_variants(salon.image), old_variants)
+        self.assertEqual([width for width, _, _ in make_variants(salon.image)], [320, 400])
+
+    def test_svg_and_broken_files_pass_through(self):
+        svg = Procedure.objects.create(
+            title="Маникюр", base_price=1000,
+            image=SimpleUploadedFile("icon.svg", b"<svg xmlns='http://www.w3.org/2000/svg'/>"),
+        )
+        broken = Procedure.objects.create(
+            title="Педикюр", base_price=1000, image=SimpleUploadedFile("broken.jpg", b"not an image"),
+        )
+
+        self.assertEqual(thumbnail_url(svg.image, "avatar"), svg.image.url)
+        self.assertEqual(thumbnail_url(broken.image, "avatar"), broken.image.url)
+        self.assertEqual(thumbnail_url(Procedure(title="Без фото").image, "avatar"), "")
+        self.assertEqual(make_variants(svg.image), [])
+        self.assertEqual(make_variants(broken.image), [])
+
+    def test_admin_and_pages_use_thumbnails(self):
+        specialist = Specialist.objects.create(full_name="Мастер", photo=uploaded_image())
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(admin)
+
+        changelist = self.client.get("/admin/core/specialist/").content.decode()
+        self.assertIn(f"/media/{self.thumbnail(specialist.photo, 'admin')}", changelist)
+        self.assertNotIn(f'src="/media/{specialist.photo.name}"', changelist)
+
+        salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1", image=uploaded_image())
+        caches["default"].clear()
+        index = self.client.get("/").content.decode()
+        self.assertIn(f"/media/{self.thumbnail(specialist.photo, 'avatar')}", index)
+        self.assertIn(self.variant(salon.image, 640, "webp"), index)
+        self.assertNotIn(f'src="/media/{salon.image.name}"', index)
+
+    def test_responsive_variants_never_upscale(self):
+        salon = Salon.objects.create(name="Салон", address="ул. Тестовая, 1", image=uploaded_image(size=(800, 600)))
+
+        variants = make_variants(salon.image)
+
+        self.assertEqual([width for width, _, _ in variants], [320, 640, 800])
+        for width, webp_name, jpeg_name in variants:
+            self.assertEqual((webp_name, jpeg_name), (
+                self.variant(salon.image, width, "webp"), self.variant(salon.image, width, "jpg"),
+            ))
+            for name, image_format in ((webp_name, "WEBP"), (jpeg_name, "JPEG")):
+                with Image.open(salon.image.storage.path(name)) as image:
+                    self.assertEqual((image.format, image.size), (image_format, (width, width * 3 // 4)))
+
+    def test_responsive_image_tag(self):
+        procedure = Procedure.objects.create(title="Маникюр", base_price=1000, image=uploaded_image())
+
+        html = responsive_image(procedure.image, alt="Маникюр", sizes="50vw", css_class="services__block_img")
+
+        self.assertTrue(html.startswith("<picture><source type=\"image/webp\""))
+        webp_320 = procedure.image.storage.url(self.variant(procedure.image, 320, "webp"))
+        jpeg_640 = procedure.image.storage.url(self.variant(procedure.image, 640, "jpg"))
+        self.assertIn(f"{webp_320} 320w", html)
+        self.assertIn(f'src="{jpeg_640}"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('sizes="50vw"', html)
+
+        svg = Procedure.objects.create(
+            title="Педикюр", base_price=1000,
+            image=SimpleUploadedFile("icon.svg", b"<svg xmlns='http://www.w3.org/2000/svg'/>"),
+        )
+        self.assertEqual(
+            responsive_image(svg.image, alt="Педикюр"),
+            f'<img src="{svg.image.url}" alt="Педикюр" class="" loading="lazy" decoding="async">',
+        )
+
+    def test_backfill_command_builds_missing_variants(self):
+        procedure = Procedure.objects.create(title="Маникюр", base_price=1000, image=uploaded_image())
+        storage = procedure.image.storage
+        generated = [self.variant(procedure.image, 320, "webp"), self.thumbnail(procedure.image, "admin")]
+        for name in generated:
+            storage.delete(name)
+        thumbnails_module._existing.clear()
+
+        out = StringIO()
+        call_command("build_image_variants", "--workers", "2", stdout=out)
+
+        self.assertIn("Обработано фото: 1", out.getvalue())
+        for name in generated:
+            self.assertTrue(storage.exists(name))
@@ -0,0 +1,238 @@
+"""
+Уменьшенные копии фото салонов, услуг и мастеров.
+
+Два вида копий, обе лежат рядом с оригиналами в MEDIA_ROOT/thumbs/:
+  * thumbs/<ширина>x<высота>/<имя>.<версия>.<расширение> — обрезка по центру
+    до точного размера (как object-fit: cover): превью в админке и аватары
+    мастеров; GIF, BMP и прочее сохраняются в JPEG;
+  * thumbs/w<ширина>/<имя>.<версия>.webp и .jpg — уменьшение по ширине
+    с сохранением пропорций для srcset (тег responsive_image); шире оригинала
+    не бывают.
+Версия — время изменения оригинала (source_version): файл, заменённый под
+тем же именем, получает новые копии, а не закэшированные старые.
+
+Копии полей из DERIVATIVE_FIELDS создаются при сохранении объекта
+(core/signals.py) и командой build_image_variants, любые недостающие —
+при первом обращении. SVG не уменьшаются: отдаётся оригинал. Если оригинал
+не читается, тоже отдаётся его URL.
+"""
+import logging
+import posixpath
+import threading
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Procedure, Salon, Specialist
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = "thumbs"
+
+# имя → (ширина, высота) в пикселях, с запасом для экранов 2x
+THUMBNAIL_SIZES = {
+    "admin": (88, 88),
+    "admin_large": (360, 360),
+    "avatar": (120, 120),
+}
+
+# ширины вариантов для srcset
+RESPONSIVE_WIDTHS = (320, 640, 960, 1280)
+
+FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".webp": "WEBP",
+}
+
+# формат → расширение обрезанной копии
+EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "WEBP": "webp",
+}
+
+# расширение → формат вариантов для srcset: WebP и JPEG для старых браузеров
+VARIANT_FORMATS = {
+    "webp": "WEBP",
+    "jpg": "JPEG",
+}
+
+# (модель, поле, нужны ли варианты для srcset)
+DERIVATIVE_FIELDS = (
+    (Salon, "image", True),
+    (Procedure, "image", True),
+    (Specialist, "photo", False),
+)
+
+# копии, про которые известно, что они уже лежат в хранилище, и ширины оригиналов
+_existing = set()
+_source_widths = {}
+_existing_lock = threading.Lock()
+
+
+def parse_size(size):
+    """Размер по имени из THUMBNAIL_SIZES, строке "120x80" или паре (ширина, высота)."""
+    if isinstance(size, str):
+        if size in THUMBNAIL_SIZES:
+            return THUMBNAIL_SIZES[size]
+        width, _, height = size.partition("x")
+        return int(width), int(height)
+    return tuple(size)
+
+
+def is_svg(name):
+    return name.lower().endswith(".svg")
+
+
+def source_version(storage, name):
+    """Версия оригинала — время изменения в миллисекундах; "" если хранилище его не знает."""
+    try:
+        modified = storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        return ""
+    return format(int(modified.timestamp() * 1000), "x")
+
+
+def thumbnail_format(name):
+    """Формат обрезанной копии: формат оригинала из FORMATS, остальные (GIF, BMP…) — JPEG."""
+    return FORMATS.get(posixpath.splitext(name)[1].lower(), "JPEG")
+
+
+def _derivative_name(name, version, extension):
+    # расширение оригинала остаётся в имени: photo.png и photo.jpg не столкнутся
+    return f"{name}.{version}.{extension}" if version else f"{name}.{extension}"
+
+
+def thumbnail_name(name, size, version=""):
+    width, height = parse_size(size)
+    extension = EXTENSIONS[thumbnail_format(name)]
+    return posixpath.join(THUMBNAILS_DIR, f"{width}x{height}", _derivative_name(name, version, extension))
+
+
+def variant_name(name, width, extension, version=""):
+    return posixpath.join(THUMBNAILS_DIR, f"w{width}", _derivative_name(name, version, extension))
+
+
+def _render(storage, source_name, name, transform, image_format):
+    """Создать копию name из source_name, если её ещё нет; возвращает name или None."""
+    known = (getattr(storage, "location", ""), name)
+    if known in _existing or storage.exists(name):
+        _existing.add(known)
+        return name
+
+    try:
+        with storage.open(source_name, "rb") as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Не удалось открыть изображение %s", source_name)
+        return None
+
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    transform(image).save(buffer, image_format, quality=85 if image_format == "JPEG" else 80, optimize=True)
+
+    with _existing_lock:
+        if not storage.exists(name):
+            saved = storage.save(name, ContentFile(buffer.getvalue()))
+            if saved != name:
+                # копию успел сохранить другой процесс — лишний файл не нужен
+                storage.delete(saved)
+        _existing.add(known)
+    return name
+
+
+def make_thumbnail(field_file, size, version=None):
+    """Обрезанная копия размера size; возвращает её имя в хранилище или None."""
+    size = parse_size(size)
+    if version is None:
+        version = source_version(field_file.storage, field_file.name)
+    return _render(
+        field_file.storage,
+        field_file.name,
+        thumbnail_name(field_file.name, size, version),
+        lambda image: ImageOps.fit(image, size, Image.Resampling.LANCZOS),
+        thumbnail_format(field_file.name),
+    )
+
+
+def thumbnail_url(field_file, size):
+    """URL копии размера size; для SVG и нечитаемых файлов — URL оригинала."""
+    if not field_file:
+        return ""
+    if is_svg(field_file.name):
+        return field_file.url
+    name = make_thumbnail(field_file, size)
+    return field_file.storage.url(name) if name else field_file.url
+
+
+def _source_width(storage, name, version):
+    """Ширина оригинала версии version (читается только заголовок файла) или None."""
+    key = (getattr(storage, "location", ""), name, version)
+    if key not in _source_widths:
+        try:
+            with storage.open(name, "rb") as source:
+                image = Image.open(source)
+                width, height = image.size
+                # после exif_transpose ширина повёрнутого фото — его высота
+                if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                    width = height
+        except (OSError, UnidentifiedImageError):
+            logger.warning("Не удалось открыть изображение %s", name)
+            return None
+        _source_widths[key] = width
+    return _source_widths[key]
+
+
+def _scale_to_width(width):
+    def transform(image):
+        if image.width <= width:
+            return image
+        height = max(1, round(image.height * width / image.width))
+        return image.resize((width, height), Image.Resampling.LANCZOS)
+    return transform
+
+
+def make_variants(field_file, widths=RESPONSIVE_WIDTHS):
+    """
+    Варианты для srcset: список (ширина, имя WebP, имя JPEG) по возрастанию.
+    Ширины больше оригинала заменяются шириной оригинала (не увеличиваем).
+    Пустой список — SVG или нечитаемый файл.
+    """
+    if not field_file or is_svg(field_file.name):
+        return []
+    version = source_version(field_file.storage, field_file.name)
+    source_width = _source_width(field_file.storage, field_file.name, version)
+    if source_width is None:
+        return []
+
+    variants = []
+    for width in sorted({min(width, source_width) for width in widths}):
+        names = [
+            _render(
+                field_file.storage,
+                field_file.name,
+                variant_name(field_file.name, width, extension, version),
+                _scale_to_width(width),
+                image_format,
+            )
+            for extension, image_format in VARIANT_FORMATS.items()
+        ]
+        if all(names):
+            variants.append((width, *names))
+    return variants
+
+
+def make_thumbnails(field_file, sizes=None, responsive=False):
+    """Создать копии всех размеров THUMBNAIL_SIZES, а с responsive — и варианты для srcset."""
+    if not field_file or is_svg(field_file.name):
+        return
+    version = source_version(field_file.storage, field_file.name)
+    for size in sizes or THUMBNAIL_SIZES.values():
+        make_thumbnail(field_file, size, version)
+    if responsive:
+        make_variants(field_file)
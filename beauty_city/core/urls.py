@@ -11,5 +11,8 @@ urlpatterns = [
     path('service/', views.service, name='service'),
     path('service/finally/', views.service_finally, name='service_finally'),
     
+    path('api/slots/', views.slots_api, name='slots_api'),
+    path('api/next-slots/', views.next_slots_api, name='next_slots_api'),
+    path('api/month-availability/', views.month_availability_api, name='month_availability_api'),
     path('api/validate-promo/', views.validate_promo, name='validate_promo'),
 ]
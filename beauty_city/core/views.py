@@ -1,23 +1,50 @@
+import hashlib
 import json
-from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from django.http import JsonResponse
+from django.db.models import Exists, OuterRef
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_GET, require_POST, require_safe
 from datetime import datetime, timedelta
-from .models import Salon, Procedure, Specialist, SiteSettings, Booking, PromoCode
-from .slots import get_available_slots
+from .availability import get_day_version
+from .catalog import CATALOG_CACHE_TIMEOUT, get_catalog_version
+from .models import Salon, Procedure, Specialist, SiteSettings, Booking
+from .pricing import annotate_prices, apply_discount, get_price, get_price_matrix
+from .promo_codes import PromoUnavailable, find_promo
+from .reservations import SlotUnavailable, hold_slot
+from .schedule_snapshot import get_any_master_availability
+from .site_settings import get_site_settings
+from .slot_cache import get_cached_slots
+from .slots import NEXT_SLOTS_HORIZON_DAYS, count_month_slots, find_next_slots
 from .forms import BookingForm
 
 
+def _index_etag(request):
+    """ETag главной: версия каталога и телефон менеджера — без запросов к базе."""
+    site = get_site_settings()
+    phone = site.manager_phone if site else ""
+    return hashlib.md5(f"{get_catalog_version()}:{phone}".encode()).hexdigest()
+
+
+@require_safe
+@condition(etag_func=_index_etag)
 def index(request):
-    """Главная страница"""
-    return render(request, "index.html", {
+    """
+    Главная страница.
+    Блоки каталога кэшируются фрагментами по версии каталога (core.catalog),
+    querysets ленивые — при тёплом кэше страница не делает запросов к базе.
+    """
+    response = render(request, "index.html", {
         "salons": Salon.objects.filter(is_active=True),
         "procedures": Procedure.objects.all(),
-        "specialists": Specialist.objects.filter(is_active=True).prefetch_related("procedures"),
+        "specialists": Specialist.objects.filter(is_active=True),
+        "catalog_version": get_catalog_version(),
+        "catalog_cache_timeout": CATALOG_CACHE_TIMEOUT,
     })
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 def admin_page(request):
@@ -35,14 +62,23 @@ def popup_examples(request):
     return render(request, "popup.html")
 
 
-def service(request):
-    """Страница записи на услугу"""
-
-    salons = Salon.objects.filter(is_active=True)
+def _pick_selected(objects, object_id):
+    """Выбранный объект из уже загруженного списка по id из GET; 404, если его там нет."""
+    if not object_id:
+        return None
+    for obj in objects:
+        if str(obj.pk) == object_id:
+            return obj
+    raise Http404
 
-    procedures = Procedure.objects.all()
-    specialists = Specialist.objects.filter(is_active=True)
 
+def service(request):
+    """
+    Страница записи на услугу.
+    Число запросов не зависит от данных: салоны, процедуры и мастера —
+    по одному запросу, выбранные салон и процедура берутся из этих же
+    списков, слоты — фиксированным числом запросов (см. core.slots).
+    """
     salon_id = request.GET.get("salon")
     procedure_id = request.GET.get("procedure")
     specialist_id = request.GET.get("specialist")
@@ -56,13 +92,27 @@ def service(request):
     else:
         selected_date = timezone.localdate()
 
-    selected_salon = get_object_or_404(Salon, pk=salon_id) if salon_id else None
-    selected_procedure = get_object_or_404(Procedure, pk=procedure_id) if procedure_id else None
+    if specialist_id and not specialist_id.isdigit():
+        raise Http404
+
+    salons = list(Salon.objects.filter(is_active=True))
+    selected_salon = _pick_selected(salons, salon_id)
+
+    # процедуры мастера помечаются в том же запросе, что и весь список
+    procedures = Procedure.objects.all()
+    if specialist_id:
+        procedures = procedures.annotate(by_specialist=Exists(
+            Specialist.procedures.through.objects.filter(procedure=OuterRef("pk"), specialist_id=specialist_id)
+        ))
+    procedures = annotate_prices(list(procedures), selected_salon)
+    selected_procedure = _pick_selected(procedures, procedure_id)
+
+    specialists = Specialist.objects.filter(is_active=True)
     selected_specialist = get_object_or_404(Specialist, pk=specialist_id) if specialist_id else None
 
     if selected_specialist:
-        procedures = procedures.filter(specialists=selected_specialist).distinct()
-        specialists = specialists.filter(pk=selected_specialist.pk)
+        procedures = [procedure for procedure in procedures if procedure.by_specialist]
+        specialists = [selected_specialist]
 
     elif selected_salon and selected_procedure:
         specialists = specialists.filter(
@@ -80,14 +130,26 @@ def service(request):
             procedures=selected_procedure
         ).distinct()
 
+    specialists = list(specialists)
+
     time_slots = None
+    any_master_slots = None
     if all([selected_salon, selected_procedure, selected_specialist]):
-        time_slots = get_available_slots(
+        time_slots = get_cached_slots(
             salon=selected_salon,
             specialist=selected_specialist,
             procedure=selected_procedure,
             date=selected_date,
         )
+    elif selected_salon and selected_procedure:
+        # Режим «любой мастер»: слоты сразу по всем мастерам салона
+        # (снимок дня — только для крупных салонов, см. core.schedule_snapshot)
+        any_master_slots = get_any_master_availability(
+            salon=selected_salon,
+            procedure=selected_procedure,
+            date=selected_date,
+            specialists=specialists,
+        )
 
     return render(request, "service.html", {
         "salons": salons,
@@ -99,6 +161,7 @@ def service(request):
         "selected_procedure": selected_procedure,
         "selected_specialist": selected_specialist,
         "time_slots": time_slots,
+        "any_master_slots": any_master_slots,
 
         "selected_salon_id": salon_id,
         "selected_procedure_id": procedure_id,
@@ -106,6 +169,133 @@ def service(request):
     })
 
 
+def _slots_params(request):
+    """salon, procedure, specialist и date из GET; None, если чего-то не хватает."""
+    try:
+        salon_id = int(request.GET["salon"])
+        procedure_id = int(request.GET["procedure"])
+        specialist_id = int(request.GET["specialist"])
+        selected_date = datetime.strptime(request.GET["date"], "%Y-%m-%d").date()
+    except (KeyError, ValueError):
+        return None
+    return salon_id, procedure_id, specialist_id, selected_date
+
+
+def _slots_etag(request):
+    """
+    ETag слотов без их расчёта: версия дня мастера + длительность процедуры.
+    Для сегодняшнего дня добавляется текущая минута — прошедшие слоты исчезают.
+    """
+    params = _slots_params(request)
+    if params is None:
+        return None
+    salon_id, procedure_id, specialist_id, selected_date = params
+
+    duration = Procedure.objects.filter(pk=procedure_id).values_list("duration_minutes", flat=True).first()
+    if duration is None:
+        return None
+    version = get_day_version(salon_id, specialist_id, selected_date)
+
+    etag = f"{salon_id}-{specialist_id}-{procedure_id}-{duration}-{selected_date:%Y%m%d}-v{version}"
+    current = timezone.localtime()
+    if selected_date == current.date():
+        etag += f"-{current:%H%M}"
+    return etag
+
+
+@require_GET
+@condition(etag_func=_slots_etag)
+def slots_api(request):
+    """
+    Свободное время для выбранных салона, услуги, мастера и даты (JSON).
+    URL: /api/slots/?salon=1&procedure=2&specialist=3&date=2026-02-01
+    Повторный запрос с If-None-Match получает 304 без расчёта слотов.
+    """
+    params = _slots_params(request)
+    if params is None:
+        return JsonResponse({"error": "Нужны salon, procedure, specialist и date"}, status=400)
+    salon_id, procedure_id, specialist_id, selected_date = params
+
+    time_slots = get_cached_slots(
+        salon=get_object_or_404(Salon, pk=salon_id),
+        specialist=get_object_or_404(Specialist, pk=specialist_id),
+        procedure=get_object_or_404(Procedure, pk=procedure_id),
+        date=selected_date,
+    )
+
+    response = JsonResponse({
+        "date": selected_date.isoformat(),
+        "slots": [t.strftime("%H:%M") for t in time_slots],
+    })
+    # Браузер хранит ответ, но каждый раз перепроверяет его по ETag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_GET
+def next_slots_api(request):
+    """
+    Ближайшее свободное время мастера (или любого мастера салона).
+    URL: /api/next-slots/?salon=1&procedure=2[&specialist=3][&limit=5][&days=30]
+    """
+    try:
+        salon_id = int(request.GET["salon"])
+        procedure_id = int(request.GET["procedure"])
+        specialist_id = int(request.GET["specialist"]) if request.GET.get("specialist") else None
+        limit = min(max(int(request.GET.get("limit", 1)), 1), 20)
+        days = min(max(int(request.GET.get("days", NEXT_SLOTS_HORIZON_DAYS)), 1), NEXT_SLOTS_HORIZON_DAYS)
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Нужны salon и procedure"}, status=400)
+
+    found = find_next_slots(
+        salon=get_object_or_404(Salon, pk=salon_id),
+        procedure=get_object_or_404(Procedure, pk=procedure_id),
+        specialist=get_object_or_404(Specialist, pk=specialist_id) if specialist_id else None,
+        days=days,
+        limit=limit,
+    )
+
+    return JsonResponse({
+        "slots": [
+            {
+                "date": day.isoformat(),
+                "time": slot_time.strftime("%H:%M"),
+                "specialist_id": specialist.pk,
+                "specialist": specialist.full_name,
+            }
+            for day, slot_time, specialist in found
+        ],
+    })
+
+
+@require_GET
+def month_availability_api(request):
+    """
+    Сколько свободных времён в каждом дне месяца (для календаря).
+    URL: /api/month-availability/?salon=1&procedure=2[&specialist=3]&month=2026-02
+    """
+    try:
+        salon_id = int(request.GET["salon"])
+        procedure_id = int(request.GET["procedure"])
+        specialist_id = int(request.GET["specialist"]) if request.GET.get("specialist") else None
+        month_start = datetime.strptime(request.GET["month"], "%Y-%m")
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Нужны salon, procedure и month (YYYY-MM)"}, status=400)
+
+    counts = count_month_slots(
+        salon=get_object_or_404(Salon, pk=salon_id),
+        procedure=get_object_or_404(Procedure, pk=procedure_id),
+        specialist=get_object_or_404(Specialist, pk=specialist_id) if specialist_id else None,
+        year=month_start.year,
+        month=month_start.month,
+    )
+
+    return JsonResponse({
+        "month": f"{month_start:%Y-%m}",
+        "days": {day.isoformat(): count for day, count in counts.items()},
+    })
+
+
 def service_finally(request):
     """Подтверждение записи и оплата"""
     # Получаем параметры из URL
@@ -118,6 +308,8 @@ def service_finally(request):
     # Проверяем, что все параметры есть
     if not all([salon_id, procedure_id, specialist_id, date_str, time_str]):
         return redirect('service')
+    if not all(value.isdigit() for value in (salon_id, procedure_id, specialist_id)):
+        return redirect('service')
 
     try:
         # Получаем объекты
@@ -127,6 +319,8 @@ def service_finally(request):
     except (Salon.DoesNotExist, Procedure.DoesNotExist, Specialist.DoesNotExist):
         return redirect('service')
 
+    price = get_price(salon, procedure)
+
     if request.method == 'POST':
         form = BookingForm(request.POST)
 
@@ -148,22 +342,37 @@ def service_finally(request):
                 minutes=procedure.duration_minutes
             )
 
-            # УСТАНАВЛИВАЕМ ЦЕНЫ
-            booking.price_original = procedure.base_price
-            booking.price_final = procedure.base_price
-
-            booking.save()
-
-            # Перенаправляем на оплату
-            return redirect('create_payment', booking_id=booking.id)
+            # УСТАНАВЛИВАЕМ ЦЕНЫ (цена салона, если задана)
+            booking.price_original = price
+            booking.price_final = price
+
+            # Скидку считаем сами: final_price из формы не используется.
+            # Промокод перестал действовать, пока клиент заполнял форму, —
+            # показываем ошибку, а не записываем молча по полной цене
+            promo_code = request.POST.get('promo_code_final') or request.POST.get('promo_code')
+            if promo_code:
+                try:
+                    promo = find_promo(promo_code)
+                except PromoUnavailable as e:
+                    form.add_error(None, str(e))
+                else:
+                    booking.promo_code_id = promo.pk
+                    booking.price_final = apply_discount(price, promo.discount_percent)
+
+            # Сохраняем с атомарной проверкой, что время ещё свободно
+            if not form.errors:
+                try:
+                    hold_slot(booking)
+                except (SlotUnavailable, PromoUnavailable) as e:
+                    form.add_error(None, str(e))
+                else:
+                    # Перенаправляем на оплату
+                    return redirect('create_payment', booking_id=booking.id)
         else:
             print("FORM ERRORS:", form.errors)
     else:
             # GET запрос - создаем предзаполненную форму
         initial_data = {
-            'salon': salon_id,
-            'procedure': procedure_id,
-            'specialist': specialist_id,
             'customer_name': '',
             'phone': '',
             'question': '',
@@ -175,6 +384,7 @@ def service_finally(request):
         'selected_salon': salon,
         'selected_procedure': procedure,
         'selected_specialist': specialist,
+        'price': price,
         'selected_date': date_str,
         'selected_time': time_str,
     })
@@ -186,48 +396,32 @@ def validate_promo(request):
     try:
         data = json.loads(request.body)
         code = data.get("promo_code", "").strip()
-        procedure_id = data.get("procedure_id")
-    except (ValueError, TypeError, json.JSONDecodeError):
+        procedure_id = int(data.get("procedure_id") or 0)
+        salon_id = int(data.get("salon_id") or 0)
+    except (ValueError, TypeError, AttributeError, json.JSONDecodeError):
         return JsonResponse({"error": "Некорректные данные"}, status=400)
 
     if not procedure_id:
         return JsonResponse({"error": "Не указана процедура"}, status=400)
 
-    # Получаем базовую цену из общей процедуры
-    try:
-        procedure = Procedure.objects.get(id=procedure_id)
-        base_price = procedure.base_price  # Это Decimal!
-    except Procedure.DoesNotExist:
+    # Цена в салоне (или базовая) из матрицы цен — без запроса процедуры
+    base_price = get_price_matrix().price(salon_id, procedure_id)
+    if base_price is None:
         return JsonResponse({
             "valid": False,
             "error": "Процедура не найдена"
         })
 
     try:
-        promo = PromoCode.objects.get(code__iexact=code, is_active=True)
-    except PromoCode.DoesNotExist:
-        return JsonResponse({
-            "valid": False,
-            "error": "Промокод не найден или неактивен"
-        })
-
-    from datetime import date
-    today = date.today()
-
-    if promo.valid_from and promo.valid_from > today:
-        return JsonResponse({
-            "valid": False,
-            "error": "Промокод ещё не активен"
-        })
-    if promo.valid_to and promo.valid_to < today:
+        promo = find_promo(code)
+    except PromoUnavailable as e:
         return JsonResponse({
             "valid": False,
-            "error": "Срок действия промокода истёк"
+            "error": str(e)
         })
 
     # Считаем новую цену
-    discount = base_price * Decimal(promo.discount_percent) / Decimal(100)
-    new_price = (base_price - discount).quantize(Decimal('0.01'))
+    new_price = apply_discount(base_price, promo.discount_percent)
 
     return JsonResponse({
         "valid": True,